@@ -0,0 +1,221 @@
+import heapq
+from bumblebee_pollination_abm.Utils import BeeStage, BeeType, PlantStage, PlantType
+from bumblebee_pollination_abm.CustomAgents.PlantAgent import DAILY_RECHARGE_STEPS
+
+
+class RechargingSum():
+    """
+    Running sum of resource storages recharging lazily at the same rate, up to the same maximum.
+    A storage set to value at the recharge clock t is worth min(value + rate*(clock - t), maximum):
+    the storages below the maximum are kept as their origin value - rate*t,
+    and a max-heap of the origins moves them to the saturated ones as the clock grows.
+    """
+
+    def __init__(self, rate, maximum):
+        self.rate = rate
+        self.maximum = maximum
+        self.origins = {}
+        self.origin_sum = 0
+        self.heap = []
+        self.saturated = set()
+
+    def set(self, key, value, clock):
+        self.discard(key)
+        if value >= self.maximum:
+            self.saturated.add(key)
+            return
+        origin = value - self.rate*clock
+        self.origins[key] = origin
+        self.origin_sum += origin
+        heapq.heappush(self.heap, (-origin, key))
+        if len(self.heap) > 2*len(self.origins) + 64:
+            # drop the entries of the values set again or saturated
+            self.heap = [(-origin, key) for key, origin in self.origins.items()]
+            heapq.heapify(self.heap)
+
+    def discard(self, key):
+        origin = self.origins.pop(key, None)
+        if origin is not None:
+            self.origin_sum -= origin
+        else:
+            self.saturated.discard(key)
+
+    def getTotal(self, clock):
+        threshold = self.maximum - self.rate*clock
+        while self.heap and -self.heap[0][0] >= threshold:
+            origin, key = heapq.heappop(self.heap)
+            if self.origins.get(key) == -origin:
+                del self.origins[key]
+                self.origin_sum += origin
+                self.saturated.add(key)
+        return self.origin_sum + self.rate*clock*len(self.origins) + self.maximum*len(self.saturated)
+
+
+class AggregateRegistry():
+    """
+    Running sums and counts behind the model reporters, updated by the plants and the bees when they change,
+    so that every reporter is read in constant time.
+    The flowering plants are tracked with their seed production probability and their storages,
+    the foraging bees with their intra/inter pollen score.
+    The sums are rebuilt from the agents at every daily step, to bound the floating point drift.
+    """
+
+    def __init__(self, model, debug = False):
+        self.model = model
+        # cross-check every reporter against the full scan of the agents
+        self.debug = debug
+        self.clear()
+
+    def clear(self):
+        self.flower_type_counts = [0]*len(PlantType)
+        self.seed_probs = {}
+        self.seed_prob_sum = 0
+        # RechargingSum of the storages, by (step recharge, maximum storage)
+        self.nectar_sums = {}
+        self.pollen_sums = {}
+        self.plant_sums = {}
+        # intra/inter pollen score of the bees, summed for all but the queens,
+        # which only count during their first foraging days
+        self.bees = {}
+        self.bee_scores = {}
+        self.score_sum = 0
+        self.queens = {}
+        self.present_types = []
+        self.scores_outdated = False
+
+    def rebuild(self, plants, bees):
+        self.clear()
+        for plant in plants:
+            self.addPlant(plant)
+        for bee in bees:
+            self.indexBee(bee)
+
+    def getRechargeClock(self):
+        return self.model.schedule.steps + DAILY_RECHARGE_STEPS*self.model.schedule.day_count
+
+    def addPlant(self, plant):
+        if plant.plant_stage != PlantStage.FLOWER or plant.unique_id in self.seed_probs:
+            return
+        t = plant.plant_type.value-1
+        self.flower_type_counts[t] += 1
+        if self.flower_type_counts[t] == 1:
+            self.scores_outdated = True
+        self.seed_probs[plant.unique_id] = plant.seed_production_prob
+        self.seed_prob_sum += plant.seed_production_prob
+        nectar_sum = self.nectar_sums.get((plant.nectar_step_recharge, plant.max_nectar_storage))
+        if nectar_sum is None:
+            nectar_sum = self.nectar_sums[(plant.nectar_step_recharge, plant.max_nectar_storage)] = RechargingSum(plant.nectar_step_recharge, plant.max_nectar_storage)
+        pollen_sum = self.pollen_sums.get((plant.pollen_step_recharge, plant.max_pollen_storage))
+        if pollen_sum is None:
+            pollen_sum = self.pollen_sums[(plant.pollen_step_recharge, plant.max_pollen_storage)] = RechargingSum(plant.pollen_step_recharge, plant.max_pollen_storage)
+        self.plant_sums[plant.unique_id] = (nectar_sum, pollen_sum)
+        clock = self.getRechargeClock()
+        nectar_sum.set(plant.unique_id, plant.nectar_storage, clock)
+        pollen_sum.set(plant.unique_id, plant.pollen_storage, clock)
+
+    def removePlant(self, plant):
+        seed_prob = self.seed_probs.pop(plant.unique_id, None)
+        if seed_prob is None:
+            return
+        self.seed_prob_sum -= seed_prob
+        t = plant.plant_type.value-1
+        self.flower_type_counts[t] -= 1
+        if self.flower_type_counts[t] == 0:
+            self.scores_outdated = True
+        nectar_sum, pollen_sum = self.plant_sums.pop(plant.unique_id)
+        nectar_sum.discard(plant.unique_id)
+        pollen_sum.discard(plant.unique_id)
+
+    def updateSeedProb(self, plant):
+        seed_prob = self.seed_probs.get(plant.unique_id)
+        if seed_prob is not None:
+            self.seed_probs[plant.unique_id] = plant.seed_production_prob
+            self.seed_prob_sum += plant.seed_production_prob - seed_prob
+
+    def updateNectar(self, plant):
+        sums = self.plant_sums.get(plant.unique_id)
+        if sums is not None:
+            sums[0].set(plant.unique_id, plant.nectar_storage, self.getRechargeClock())
+
+    def updatePollen(self, plant):
+        sums = self.plant_sums.get(plant.unique_id)
+        if sums is not None:
+            sums[1].set(plant.unique_id, plant.pollen_storage, self.getRechargeClock())
+
+    def indexBee(self, bee):
+        if bee.bee_type not in (BeeType.QUEEN, BeeType.MALE, BeeType.WORKER) or bee.bee_stage not in (BeeStage.BEE, BeeStage.QUEEN):
+            return
+        score = 0 if self.scores_outdated else self.getScore(bee)
+        self.bees[bee.unique_id] = bee
+        self.bee_scores[bee.unique_id] = score
+        if bee.bee_stage == BeeStage.QUEEN:
+            self.queens[bee.unique_id] = bee
+        else:
+            self.score_sum += score
+
+    def unindexBee(self, bee):
+        if self.bees.pop(bee.unique_id, None) is None:
+            return
+        score = self.bee_scores.pop(bee.unique_id)
+        if self.queens.pop(bee.unique_id, None) is None:
+            self.score_sum -= score
+
+    def updateBee(self, bee):
+        score = self.bee_scores.get(bee.unique_id)
+        if score is None or self.scores_outdated:
+            return
+        new_score = self.getScore(bee)
+        self.bee_scores[bee.unique_id] = new_score
+        if bee.unique_id not in self.queens:
+            self.score_sum += new_score - score
+
+    def getScore(self, bee):
+        """
+        Sum of the distances of the rewards remembered for each plant type in bloom
+        from an even share of the memory, 0 with no reward of those types.
+        """
+        counts = [bee.rewarded_memory.getCount(plant_type) for plant_type in self.present_types]
+        if sum(counts) == 0:
+            return 0
+        average = bee.max_memory/len(self.present_types)
+        return sum(abs(count-average) for count in counts)
+
+    def rescoreBees(self):
+        self.present_types = [plant_type for plant_type in PlantType if self.flower_type_counts[plant_type.value-1] > 0]
+        self.scores_outdated = False
+        self.score_sum = 0
+        for bee_id, bee in self.bees.items():
+            score = self.bee_scores[bee_id] = self.getScore(bee)
+            if bee_id not in self.queens:
+                self.score_sum += score
+
+    def getSeedProducingProbability(self):
+        count = len(self.seed_probs)
+        return self.seed_prob_sum/count if count > 0 else 0
+
+    def getPlantNectarAverage(self):
+        count = len(self.seed_probs)
+        if count == 0:
+            return 0
+        clock = self.getRechargeClock()
+        return sum(nectar_sum.getTotal(clock) for nectar_sum in self.nectar_sums.values())/count
+
+    def getPlantPollenAverage(self):
+        count = len(self.seed_probs)
+        if count == 0:
+            return 0
+        clock = self.getRechargeClock()
+        return sum(pollen_sum.getTotal(clock) for pollen_sum in self.pollen_sums.values())/count
+
+    def getIntraInterPollen(self):
+        if len(self.seed_probs) == 0:
+            return 0
+        if self.scores_outdated:
+            self.rescoreBees()
+        score_sum = self.score_sum
+        count = len(self.bee_scores) - len(self.queens)
+        for queen in self.queens.values():
+            if self.model.schedule.days <= queen.queen_foraging_days:
+                score_sum += self.bee_scores[queen.unique_id]
+                count += 1
+        return score_sum/count if count > 0 else 0
@@ -1,11 +1,32 @@
 from mesa.agent import Agent
 import numpy as np
 from math import floor
-from bumblebee_pollination_abm.Utils import BeeStage, BeeType, PlantType, ColonySize
+from bumblebee_pollination_abm.Utils import BeeStage, BeeType, PlantType, ColonySize, RewardedMemory
 from typing import Dict
+from collections.abc import Mapping
 
 
 
+class PollenView(Mapping):
+    """
+    Read-only dict-like view, keyed by PlantType, of the pollen load of a bee.
+    """
+
+    def __init__(self, bee):
+        self.bee = bee
+
+    def __getitem__(self, plant_type):
+        return float(self.bee.pollen_load[plant_type.value-1])
+
+    def __iter__(self):
+        return iter(PlantType)
+
+    def __len__(self):
+        return len(PlantType)
+
+    def values(self):
+        return self.bee.pollen_load.tolist()
+
 
 class BeeAgent(Agent):
     """
@@ -92,16 +113,18 @@ class BeeAgent(Agent):
         self.queen_foraging_days = self.days_per_eggs + self.stage_days[BeeStage.EGG] + self.stage_days[BeeStage.LARVAE] + self.stage_days[BeeStage.PUPA]
 
 
-        self.resetRewardedMemory() #list of tuple (plant_type, reward)
-        self.bee_type = bee_type
         self.max_memory = max_memory
+        self.rewarded_memory = RewardedMemory(self.max_memory) #ring buffer of tuple (plant_type, reward)
+        self.bee_type = bee_type
         self.last_flower_position = None
         self.nectar = 0
-        self.pollen = {}
+        self.pollen_load = np.zeros(len(PlantType)) #pollen quantity indexed by PlantType.value-1
+        self.pollen_total = 0
         self.colony = colony
         self.age = 0 #days
-        self.mated = False
-        self.bee_stage = bee_stage
+        self._mated = False
+        self._bee_stage = bee_stage
+        self.model.indexBee(self)
         self.sampling_mode = True
         self.days_since_last_egg_batch = 0
         self.batch_laid = 0
@@ -113,9 +136,17 @@ class BeeAgent(Agent):
     def __del__(self):
         pass#self.model.log("Deleted bumblebee", self.unique_id, self.bee_type.name)
     
+    @property
+    def pollen(self) -> PollenView:
+        return PollenView(self)
+
     def initializePollen(self):
-        for type in PlantType:
-            self.pollen[type] = 0
+        self.pollen_load.fill(0)
+        self.pollen_total = 0
+
+    def addPollen(self, plant_type, quantity):
+        self.pollen_load[plant_type.value-1] += quantity
+        self.pollen_total += quantity
 
     def updateCollectionRatio(self):
         # il polline e nettare collezionato aumenta con l'età
@@ -127,28 +158,92 @@ class BeeAgent(Agent):
     def pesticideConfusion(self):
         #self.model.log(f"Bumblebee {self.unique_id} confused")
         self.max_memory = floor(self.max_memory/2)
+        self.rewarded_memory.resize(self.max_memory)
         self.resetRewardedMemory()
         self.confused = True
 
+    @property
+    def bee_stage(self):
+        return self._bee_stage
+
+    @bee_stage.setter
+    def bee_stage(self, value):
+        self.model.unindexBee(self)
+        self._bee_stage = value
+        self.model.indexBee(self)
+
+    @property
+    def mated(self):
+        return self._mated
+
+    @mated.setter
+    def mated(self, value):
+        self.model.unindexBee(self)
+        self._mated = value
+        self.model.indexBee(self)
+
+    @property
+    def age(self):
+        return self.model.schedule.day_count - self.age_origin
+
+    @age.setter
+    def age(self, value):
+        # the age grows with the daily passes of the schedule
+        self.age_origin = self.model.schedule.day_count - value
+
+    def isActive(self):
+        # eggs, larvae, pupae and hibernating queens have nothing to do in a step,
+        # nest bees never leave the colony
+        return self.bee_stage in (BeeStage.BEE, BeeStage.QUEEN) and self.bee_type != BeeType.NEST_BEE
+
+    def getNextEventDay(self):
+        # brood and nest bees only wake up for their stage transition, hibernating queens on the first day of the year
+        if self.bee_stage in (BeeStage.EGG, BeeStage.LARVAE, BeeStage.PUPA):
+            return self.age_origin + self.stage_days[self.bee_stage]
+        if self.bee_stage == BeeStage.BEE and self.bee_type == BeeType.NEST_BEE:
+            return self.age_origin + self.stage_days[BeeStage.BEE][BeeType.NEST_BEE]
+        if self.bee_stage == BeeStage.HIBERNATION:
+            return self.model.schedule.next_day_of_year(1)
+        return None
+
     def step(self):
+        self.foragingStep(self.model.schedule.steps)
+
+    def foragingStep(self, steps):
         if(self.bee_stage != BeeStage.HIBERNATION):
-            if self.shouldReturnToColony():
+            if self.shouldReturnToColony(steps):
                 self.returnToColonyStep()
             else:
-                if self.shouldCollectPollenAndNectar():
+                if self.shouldCollectPollenAndNectar(steps):
                     self.collectPollenAndNectar()
 
-    def shouldReturnToColony(self):
+    def tripStep(self, first_step, last_step):
+        """
+        Run the foraging steps from first_step to last_step (excluded) in a single call.
+        After every step but the last one, the flowers in the cell of the bee receive its pollen:
+        the last one is deposited by the plant phase, together with the other bees.
+        """
+        for steps in range(first_step, last_step):
+            self.foragingStep(steps)
+            if steps < last_step - 1:
+                for plant in self.model.grid.flowers[self.pos[0]][self.pos[1]]:
+                    plant.receivePollen((self,))
+
+    def shouldReturnToColony(self, steps = None):
         # simulare viaggi (ogni tot step, torna alla colonia e deposita polline e nettare)
         # males never return to the colony
+        if steps is None:
+            steps = self.model.schedule.steps
         return (
-            (self.model.schedule.steps != 0 and self.model.schedule.steps % self.steps_colony_return == 0 and self.bee_type != BeeType.MALE) or
-            (sum(self.pollen.values()) >= self.max_pollen_load)
+            (steps != 0 and steps % self.steps_colony_return == 0 and self.bee_type != BeeType.MALE) or
+            (self.pollen_total >= self.max_pollen_load)
         )
 
-    def shouldCollectPollenAndNectar(self):
+    def shouldCollectPollenAndNectar(self, steps = None):
         #colleziona polline e nettare dalla pianta in cui sono
         # foraging workers, males and new queens
+        if steps is None:
+            steps = self.model.schedule.steps
         return (
             (
                 (self.bee_type != BeeType.NEST_BEE and self.bee_stage == BeeStage.BEE) or
@@ -156,7 +251,7 @@ class BeeAgent(Agent):
             ) and
             (
                 (not self.confused) or 
-                self.model.schedule.steps % self.steps_for_consfused_flower_visit == 0
+                steps % self.steps_for_consfused_flower_visit == 0
             )
         )
 
@@ -180,11 +275,16 @@ class BeeAgent(Agent):
         pass
 
     def resetRewardedMemory(self):
-        self.rewarded_memory = []
+        self.rewarded_memory.clear()
+        if self.model.aggregates is not None:
+            self.model.aggregates.updateBee(self)
 
     def dailyStep(self):
-        self.age += 1
         self.updateStage()
+        self.dailyActivities()
+
+    def dailyActivities(self):
+        # the daily step after the stage update, also run by the bees emerging from a cohort
         if(self.bee_stage != BeeStage.HIBERNATION):
             if(self.model.schedule.days % self.days_till_sampling_mode == 0):
                 self.sampling_mode = True
@@ -211,7 +311,7 @@ class BeeAgent(Agent):
 
     def mating(self):
         # TODO check plausibility
-        available_queens = [a for a in self.model.schedule.agents_by_type[BeeAgent].values() if a.bee_type == BeeType.QUEEN and a.bee_stage == BeeStage.BEE and (not a.mated)]
+        available_queens = list(self.model.unmated_queens.values())
         if len(available_queens) > 0:
             self.model.random.shuffle(available_queens)
             queen = available_queens.pop()
@@ -271,11 +371,11 @@ class BeeAgent(Agent):
                 self.bee_type == BeeType.QUEEN and 
                 self.mated and 
                 (
-                    (self.nectar >= self.hibernation_resources[0] and sum(self.pollen.values()) >= self.hibernation_resources[1]) or
+                    (self.nectar >= self.hibernation_resources[0] and self.pollen_total >= self.hibernation_resources[1]) or
                     (self.model.random.random() < self.hibernation_survival_probability)
                 )
             ):
-                self.model.log(f"resources: {self.nectar} {sum(self.pollen.values())}")
+                self.model.log(f"resources: {self.nectar} {self.pollen_total}")
                 self.bee_stage = BeeStage.HIBERNATION
                 self.age = 0
                 if self.colony is not None:
@@ -318,7 +418,7 @@ class BeeAgent(Agent):
             plant = plant_in_same_position[0]
             pollen_from_plant = plant.getPollen(self.collection_ratio)
             nectar_from_plant = plant.getNectar(self.collection_ratio)
-            self.pollen[plant.plant_type] += pollen_from_plant
+            self.addPollen(plant.plant_type, pollen_from_plant)
             self.nectar += nectar_from_plant
             self.enqueueNewReward(plant.plant_type, nectar_from_plant)
 
@@ -326,19 +426,18 @@ class BeeAgent(Agent):
             self.sampling_mode = False
 
     def enqueueNewReward(self, plant_type, nectar_from_plant):
-        self.rewarded_memory.append((plant_type, nectar_from_plant))
-        if(len(self.rewarded_memory) > self.max_memory):
-            self.rewarded_memory.pop(0)
+        self.rewarded_memory.push(plant_type, nectar_from_plant)
+        if self.model.aggregates is not None:
+            self.model.aggregates.updateBee(self)
 
-    def choosePlantToVisit(self, neighbors):
+    def choosePlantToVisit(self, neighbors, flower_type_counts):
         newPosition = neighbors[self.model.random.randint(0, len(neighbors))].pos
         if(not self.sampling_mode):
             plantMeanRewards = self.getPlantMeanRewards()
             if(len(plantMeanRewards) > 0):
-                plant_types = {n.plant_type for n in neighbors}
-                plantMaxReward = max(((k, v) for k, v in plantMeanRewards.items() if v > 0 and k in plant_types), default=None, key=lambda x: x[1])
+                plantMaxReward = max(((k, v) for k, v in plantMeanRewards.items() if v > 0 and flower_type_counts[k.value-1] > 0), default=None, key=lambda x: x[1])
                 if plantMaxReward is not None:
-                    plants_to_choose = [n for n in neighbors if n.plant_type == plantMaxReward[0]]
+                    plants_to_choose = self.model.grid.get_plant_neighbors(self.pos, True, radius=10, plant_type=plantMaxReward[0])
                     if (len(plants_to_choose)) > 1:
                         plants_to_choose = plants_to_choose[self.model.random.randint(0, len(plants_to_choose))]
                     else:
@@ -350,10 +449,12 @@ class BeeAgent(Agent):
 
     def getNewPosition(self):
         # guarda per ogni pianta se è nella memoria del bombo e scegli di visitare quella con reward maggiore e spostati in quella posizione
-        neighbors = self.model.grid.get_plant_neighbors(self.pos, True, radius=10)
+        # the neighbors are materialized only when there is at least a flower in the radius
+        flower_type_counts = self.model.grid.get_flower_type_counts(self.pos, radius=10)
 
-        if (len(neighbors) > 0):
-            newPosition = self.choosePlantToVisit(neighbors)
+        if (flower_type_counts.any()):
+            neighbors = self.model.grid.get_plant_neighbors(self.pos, True, radius=10)
+            newPosition = self.choosePlantToVisit(neighbors, flower_type_counts)
 
         elif self.last_flower_position is not None:
             # vado nel posto in cui ero prima di tornare al nido
@@ -362,22 +463,11 @@ class BeeAgent(Agent):
             newPosition = (self.last_flower_position)
 
         else:
-            neighborhood = self.model.grid.get_neighborhood(self.pos, True, radius = 10)
-            newPosition = neighborhood[self.model.random.randint(0, len(neighborhood))]
+            newPosition = self.model.grid.get_random_neighbor(self.pos, self.model.random, radius = 10)
 
             
             
         return newPosition
 
     def getPlantMeanRewards(self) -> Dict[PlantType, float]:
-        plantMeanRewards = {}
-        if not self.rewarded_memory:
-            return plantMeanRewards
-        
-        for plant_type, reward in self.rewarded_memory:
-            if plant_type not in plantMeanRewards:
-                plantMeanRewards[plant_type] = [reward]
-            else:
-                plantMeanRewards[plant_type].append(reward)
-        
-        return {key: np.mean(plantMeanRewards[key]) for key in plantMeanRewards}
\ No newline at end of file
+        return self.rewarded_memory.getMeanRewards()
\ No newline at end of file
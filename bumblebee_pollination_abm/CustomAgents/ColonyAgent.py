@@ -1,5 +1,5 @@
 import mesa
-from bumblebee_pollination_abm.Utils import BeeStage, ColonySize
+from bumblebee_pollination_abm.Utils import BeeStage, BeeType, ColonySize
 
 class ColonyAgent(mesa.Agent):
     def __init__(
@@ -8,7 +8,9 @@ class ColonyAgent(mesa.Agent):
             model,
             nectar_consumption_per_bee = 0.7,
             pollen_consumption_per_bee = 1.2,
-            days_till_death = 4
+            days_till_death = 4,
+            cohort_brood = False,
+            aggregated_nest_bees = False
         ):
         super().__init__(f"colony_{id}", model)
         self.agent_type = "colony"
@@ -20,6 +22,16 @@ class ColonyAgent(mesa.Agent):
         self.no_resource_days = 0
         self.age = 0
         self.days_till_death = days_till_death
+        # with cohort brood, eggs, larvae and pupae are counted by laying day and bee type,
+        # and become bee agents only when they emerge
+        self.cohort_brood = cohort_brood
+        self.brood = {}
+        self.brood_size = 0
+        # with aggregated nest bees, nest bees are never agents: their brood is always kept in cohorts,
+        # and the adults are counted by emergence day until they die
+        self.aggregated_nest_bees = aggregated_nest_bees
+        self.nest_bees = {}
+        self.nest_bees_size = 0
 
     def __del__(self):
         pass#self.model.log(f"Colony {self.unique_id} died")
@@ -28,10 +40,20 @@ class ColonyAgent(mesa.Agent):
         self.queen = queen
         self.addNewBee(queen)
 
+    def isActive(self):
+        return False
+
+    def getNextEventDay(self):
+        return None
+
     def step(self):
         pass
 
     def dailyStep(self):
+        if self.nest_bees_size > 0:
+            self.removeDeadNestBees()
+        if self.brood_size > 0:
+            self.emergeBrood()
         self.age += 1
         if (self.age >= self.model.false_year_duration):
             self.setColonyDead()
@@ -51,6 +73,10 @@ class ColonyAgent(mesa.Agent):
             bumblebee.bee_stage = BeeStage.DEATH
             self.model.removeDeceasedAgent(bumblebee)
         self.population = {}
+        self.brood = {}
+        self.brood_size = 0
+        self.nest_bees = {}
+        self.nest_bees_size = 0
         self.model.removeDeceasedAgent(self)
 
     def removeBee(self, agent: mesa.Agent):
@@ -62,13 +88,52 @@ class ColonyAgent(mesa.Agent):
     def addNewBee(self, agent: mesa.Agent):
         self.population[agent.unique_id] = agent
 
+    def addBrood(self, bee_type: BeeType, qty: int):
+        if qty > 0:
+            cohort = self.brood.setdefault(self.model.schedule.day_count, {})
+            cohort[bee_type] = cohort.get(bee_type, 0) + qty
+            self.brood_size += qty
+
+    def emergeBrood(self):
+        # a cohort emerges after the egg, larvae and pupa stages, each lasting at least a day
+        stage_days = self.model.bumblebee_params["stage_days"]
+        brood_days = sum(max(stage_days[stage], 1) for stage in (BeeStage.EGG, BeeStage.LARVAE, BeeStage.PUPA))
+        emerging_days = [day for day in self.brood if day + brood_days <= self.model.schedule.day_count]
+        for day in emerging_days:
+            for bee_type, qty in self.brood.pop(day).items():
+                self.brood_size -= qty
+                if bee_type == BeeType.NEST_BEE and self.aggregated_nest_bees:
+                    self.addNestBees(qty)
+                    continue
+                for _ in range(qty):
+                    # the bees emerge during the daily pass of the colonies, after the one of the bees:
+                    # they run the rest of the daily step of their emergence day, as a pupa becoming a bee does
+                    bee = self.model.createBumblebee(bee_type, BeeStage.BEE, self)
+                    bee.dailyActivities()
+
+    def addNestBees(self, qty: int):
+        if qty > 0:
+            day = self.model.schedule.day_count
+            self.nest_bees[day] = self.nest_bees.get(day, 0) + qty
+            self.nest_bees_size += qty
+
+    def removeDeadNestBees(self):
+        lifespan = max(self.model.bumblebee_params["stage_days"][BeeStage.BEE][BeeType.NEST_BEE], 1)
+        dead_days = [day for day in self.nest_bees if day + lifespan <= self.model.schedule.day_count]
+        for day in dead_days:
+            self.nest_bees_size -= self.nest_bees.pop(day)
+
+    def getPopulationSize(self):
+        # the brood counts as population even when it is not made of agents
+        return len(self.population) + self.brood_size + self.nest_bees_size
+
     def useResources(self):
-        self.nectar -= len(self.population)*self.nectar_consumption_per_bee
-        self.pollen -= len(self.population)*self.pollen_consumption_per_bee
+        self.nectar -= self.getPopulationSize()*self.nectar_consumption_per_bee
+        self.pollen -= self.getPopulationSize()*self.pollen_consumption_per_bee
 
     def collectResources(self, bee: mesa.Agent):
         self.nectar += bee.nectar
-        self.pollen += sum(bee.pollen.values())
+        self.pollen += bee.pollen_total
 
     def getResources(self):
         return (self.nectar, self.pollen)
@@ -78,9 +143,9 @@ class ColonyAgent(mesa.Agent):
     
     def getSize(self):
         # TODO check plausibility
-        if len(self.population) < 90:
+        if self.getPopulationSize() < 90:
             return ColonySize.SMALL
-        elif len(self.population) < 180:
+        elif self.getPopulationSize() < 180:
             return ColonySize.MEDIUM
         else:
             # succesful colonies reach 500 bumblebees
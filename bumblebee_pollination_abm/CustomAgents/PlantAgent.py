@@ -1,11 +1,14 @@
 import mesa
 from bumblebee_pollination_abm.Utils import PlantStage, PlantType, Season
-from math import floor
+from math import floor, ceil
 from typing import Tuple
 
 # seed hibernation is controlled by number of days a seed need to become a flower
 # the assumption is that each plant type ha only one generation per year
 
+# every day, nectar and pollen recharge as much as in this number of steps
+DAILY_RECHARGE_STEPS = 20
+
 class PlantAgent(mesa.Agent):
     def __init__(
             self, 
@@ -51,6 +54,9 @@ class PlantAgent(mesa.Agent):
         self.seed_age = seed_age #maximum seed age before becoming a flower
         self.max_nectar_storage = nectar_storage
         self.max_pollen_storage = pollen_storage
+        # the recharge is applied lazily, counting the steps and the days since the last update
+        self.last_recharge_step = self.model.schedule.steps
+        self.last_recharge_day = self.model.schedule.day_count
         self.nectar_storage = nectar_storage
         self.pollen_storage = pollen_storage
         self.plant_stage = plant_stage
@@ -58,25 +64,36 @@ class PlantAgent(mesa.Agent):
         self.age = 0
         self.max_gen_per_season = max_gen_per_season
         self.gen_number = gen_number
+        if self.model.aggregates is not None:
+            self.model.aggregates.addPlant(self)
 
     def __del__(self):
         pass#self.model.log(f"Deleted plant {self.unique_id}")
 
-    def step(self):
-        if self.plant_stage == PlantStage.FLOWER:
-            bumblebees_in_same_position = self.model.grid.get_cell_bumblebee_list_contents(self.pos)
-            for bumblebee in bumblebees_in_same_position:
-                self.updateSeedProductionProb(bumblebee)
+    @property
+    def age(self):
+        return self.model.schedule.day_count - self.age_origin
+
+    @age.setter
+    def age(self, value):
+        # the age grows with the daily passes of the schedule
+        self.age_origin = self.model.schedule.day_count - value
 
-            # nettare e polline si ricaricano anche ad ogni step (poco)
-            self.resourcesRecharge(self.nectar_step_recharge, self.pollen_step_recharge)
+    def isActive(self):
+        return self.plant_stage == PlantStage.FLOWER
+
+    def getNextEventDay(self):
+        # a plant only changes when it becomes a flower or when it produces seeds and dies
+        if self.plant_stage == PlantStage.SEED:
+            return self.age_origin + self.seed_age
+        return self.age_origin + ceil(self.flower_age[self.plant_type]/self.max_gen_per_season)
+
+    def receivePollen(self, bumblebees):
+        for bumblebee in bumblebees:
+            self.updateSeedProductionProb(bumblebee)
 
     def dailyStep(self):
-        self.age += 1
         self.updateStage()
-        # ogni giorno mi si ricarica il nettare e polline
-        if self.plant_stage == PlantStage.FLOWER:
-            self.dailyResourcesRecharge()
 
     def updateStage(self):
         if self.plant_stage == PlantStage.SEED:
@@ -84,6 +101,10 @@ class PlantAgent(mesa.Agent):
                 self.plant_stage = PlantStage.FLOWER
                 self.seed_production_prob = self.initial_seed_prod_prob
                 self.age = 0
+                self.model.grid.update_flower_index(self.pos)
+                self.model.grid.update_season_index(self.pos)
+                if self.model.aggregates is not None:
+                    self.model.aggregates.addPlant(self)
 
         elif self.plant_stage == PlantStage.FLOWER:
             self.updateFlowerStage()
@@ -110,22 +131,60 @@ class PlantAgent(mesa.Agent):
 
 
     def updateSeedProductionProb(self, bumblebee: mesa.Agent):
-        quantity_same_pollen = bumblebee.pollen[self.plant_type]
-        quantity_other_pollen = (sum(bumblebee.pollen.values()) - quantity_same_pollen) #TODO control plausibility
+        quantity_same_pollen = bumblebee.pollen_load[self.plant_type.value-1]
+        quantity_other_pollen = (bumblebee.pollen_total - quantity_same_pollen) #TODO control plausibility
     
         self.seed_production_prob = min(
             self.seed_production_prob + ((quantity_same_pollen - quantity_other_pollen) / bumblebee.max_pollen_load), 
             1
         )
-
-    def resourcesRecharge(self, amountNectar, amountPollen):
-        if(self.nectar_storage<self.max_nectar_storage):
-            self.nectar_storage = min(self.nectar_storage + amountNectar, self.max_nectar_storage)
-        if(self.pollen_storage<self.max_pollen_storage):
-            self.pollen_storage = min(self.pollen_storage + amountPollen, self.max_pollen_storage)
-
-    def dailyResourcesRecharge(self):
-        self.resourcesRecharge(self.nectar_step_recharge*20, self.pollen_step_recharge*20)
+        if self.model.aggregates is not None:
+            self.model.aggregates.updateSeedProb(self)
+
+    @property
+    def nectar_storage(self):
+        self.stepResourcesRecharge()
+        return self._nectar_storage
+
+    @nectar_storage.setter
+    def nectar_storage(self, value):
+        self.stepResourcesRecharge()
+        self._nectar_storage = value
+        if self.model.aggregates is not None:
+            self.model.aggregates.updateNectar(self)
+
+    @property
+    def pollen_storage(self):
+        self.stepResourcesRecharge()
+        return self._pollen_storage
+
+    @pollen_storage.setter
+    def pollen_storage(self, value):
+        self.stepResourcesRecharge()
+        self._pollen_storage = value
+        if self.model.aggregates is not None:
+            self.model.aggregates.updatePollen(self)
+
+    def stepResourcesRecharge(self):
+        '''
+        Apply in closed form the recharge of the steps and of the days completed since the last update.
+        '''
+        # nettare e polline si ricaricano anche ad ogni step (poco), e ogni giorno
+        steps = self.model.schedule.steps - self.last_recharge_step
+        days = self.model.schedule.day_count - self.last_recharge_day
+        if steps > 0 or days > 0:
+            self.last_recharge_step = self.model.schedule.steps
+            self.last_recharge_day = self.model.schedule.day_count
+            self.addResources(
+                self.nectar_step_recharge*(steps + DAILY_RECHARGE_STEPS*days),
+                self.pollen_step_recharge*(steps + DAILY_RECHARGE_STEPS*days)
+            )
+
+    def addResources(self, amountNectar, amountPollen):
+        if(self._nectar_storage<self.max_nectar_storage):
+            self._nectar_storage = min(self._nectar_storage + amountNectar, self.max_nectar_storage)
+        if(self._pollen_storage<self.max_pollen_storage):
+            self._pollen_storage = min(self._pollen_storage + amountPollen, self.max_pollen_storage)
 
     '''
     Returns nectar reward based on its minimum and maximum reward. 
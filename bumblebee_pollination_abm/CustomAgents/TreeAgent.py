@@ -8,5 +8,11 @@ class TreeAgent(mesa.Agent):
     def __del__(self):
         pass#self.logger.debug(f"Tree {self.unique_id} died")
 
+    def isActive(self):
+        return False
+
+    def getNextEventDay(self):
+        return None
+
     def step(self):
         pass
\ No newline at end of file
@@ -1,13 +1,306 @@
 from operator import attrgetter
+from itertools import chain
+from functools import partial
 from mesa import DataCollector
+import numpy as np
+import pandas as pd
+import threading
+import atexit
+import queue
+import types
+import os
+
+
+class BackgroundWriter():
+    """
+    Thread saving the chunks of the ColumnStores to disk, off the simulation loop.
+    The chunks wait in a queue of maxsize chunks: write blocks when it is full,
+    so that the simulation cannot run ahead of the disk by more than maxsize chunks.
+    The thread is started by the first write, so that the writer can be pickled with a model before its run.
+    """
+
+    def __init__(self, maxsize = 64):
+        self.maxsize = maxsize
+        self.queue = None
+        self.thread = None
+        self.error = None
+
+    def __getstate__(self):
+        self.join()
+        return {"maxsize": self.maxsize}
+
+    def __setstate__(self, state):
+        self.__init__(state["maxsize"])
+
+    def start(self):
+        self.queue = queue.Queue(self.maxsize)
+        self.thread = threading.Thread(target=self.run, name="BackgroundWriter", daemon=True)
+        self.thread.start()
+        # the queued chunks are written even if the run ends without a flush
+        atexit.register(self.close)
+
+    def run(self):
+        while True:
+            item = self.queue.get()
+            try:
+                if item is None:
+                    return
+                path, array = item
+                np.save(path, array, allow_pickle=array.dtype == object)
+            except Exception as ex:
+                self.error = ex
+            finally:
+                self.queue.task_done()
+
+    def checkError(self):
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
+
+    def write(self, path, array):
+        self.checkError()
+        if self.thread is None:
+            self.start()
+        self.queue.put((path, array))
+
+    def join(self):
+        """
+        Wait until every queued chunk is on disk.
+        """
+        if self.thread is not None:
+            self.queue.join()
+        self.checkError()
+
+    def close(self):
+        if self.thread is not None:
+            self.queue.put(None)
+            self.thread.join()
+            self.thread = None
+            atexit.unregister(self.close)
+        self.checkError()
+
+
+class ColumnStore():
+    """
+    Append-only column, buffered in typed numpy arrays and flushed in chunks of chunk_size rows
+    to .npy files in path, which are read back as memory maps.
+    Chunks of Python objects (e.g. None values) are pickled and loaded in memory.
+    With a BackgroundWriter, the chunks are saved by its thread.
+    """
+
+    def __init__(self, path, chunk_size = 65536, writer = None):
+        self.path = path
+        self.writer = writer
+        os.makedirs(self.path, exist_ok=True)
+        self.chunk_size = chunk_size
+        self.chunks = []
+        self.chunk_rows = 0
+        self.pending = []
+        self.pending_values = []
+        self.pending_rows = 0
+
+    def __len__(self):
+        return self.chunk_rows + self.pending_rows + len(self.pending_values)
+
+    def __iter__(self):
+        return iter(self.to_array())
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self.to_array()[index]
+        if index < 0:
+            index += len(self)
+        if index < 0 or index >= len(self):
+            raise IndexError("column index out of range")
+        if index >= self.chunk_rows:
+            # the latest rows are still in the buffer
+            return self.getPending()[index - self.chunk_rows]
+        for path in self.chunks:
+            chunk = self.loadChunk(path)
+            if index < len(chunk):
+                return chunk[index]
+            index -= len(chunk)
+
+    def append(self, value):
+        self.pending_values.append(value)
+        if len(self.pending_values) >= self.chunk_size:
+            self.flush()
+
+    def extend(self, values):
+        self.movePendingValues()
+        values = np.asarray(values)
+        self.pending.append(values)
+        self.pending_rows += len(values)
+        if self.pending_rows >= self.chunk_size:
+            self.flush()
+
+    def movePendingValues(self):
+        if self.pending_values:
+            values = np.asarray(self.pending_values)
+            self.pending.append(values)
+            self.pending_rows += len(values)
+            self.pending_values = []
+
+    def getPending(self):
+        self.movePendingValues()
+        if not self.pending:
+            return np.empty(0)
+        if len(self.pending) > 1:
+            self.pending = [np.concatenate(self.pending)]
+        return self.pending[0]
+
+    def flush(self):
+        pending = self.getPending()
+        if len(pending) == 0:
+            return
+        path = os.path.join(self.path, f"{len(self.chunks):06d}.npy")
+        if self.writer is not None:
+            # the pending arrays are never modified once flushed
+            self.writer.write(path, pending)
+        else:
+            np.save(path, pending, allow_pickle=pending.dtype == object)
+        self.chunks.append(path)
+        self.chunk_rows += len(pending)
+        self.pending = []
+        self.pending_rows = 0
+
+    def loadChunk(self, path):
+        if self.writer is not None:
+            # the chunk may still be in the queue
+            self.writer.join()
+        try:
+            return np.load(path, mmap_mode="r")
+        except ValueError:
+            return np.load(path, allow_pickle=True)
+
+    def to_array(self):
+        arrays = [self.loadChunk(path) for path in self.chunks] + [self.getPending()]
+        arrays = [array for array in arrays if len(array) > 0]
+        if not arrays:
+            return np.empty(0)
+        return np.concatenate(arrays)
+
+
+class ColumnarAgentRecords():
+    """
+    Stand-in for the _agent_records dictionary of mesa DataCollector:
+    the records of each step, stored by DataCollector.collect, are split into one ColumnStore per field.
+    """
+
+    def __init__(self, path, fields, chunk_size = 65536, writer = None):
+        self.columns = [ColumnStore(os.path.join(path, f"agent_{i}"), chunk_size, writer) for i in range(len(fields))]
+
+    def __setitem__(self, step, records):
+        if records:
+            for column, values in zip(self.columns, zip(*records)):
+                column.extend(values)
+
+    def flush(self):
+        for column in self.columns:
+            column.flush()
+
 
 class CustomDataCollector(DataCollector):
+    """
+    DataCollector of the agents of the given types.
+    Every call of collect observes the model, and a record is stored at the observations where the clock,
+    the schedule attribute named clock (e.g. steps or day_count), is a multiple of cadence,
+    so that the records line up with the daily steps.
+    The model reporters of a record are reduced over its observations with reduction
+    (a name or a dict by reporter): "last", or the streaming "mean", "min" and "max";
+    the agent reporters are recorded at the last observation, and at events (e.g. a colony death)
+    through collectEvent when cadence > 1.
+    With storage_dir, the collected values are kept in a columnar format on disk (see ColumnStore)
+    instead of growing in memory, and the dataframes are read back from it;
+    with a BackgroundWriter, the chunks are written by a background thread, until flush waits for them.
+    """
 
-    def __init__(self, agent_types, model_reporters=None, agent_reporters=None, tables=None):
+    REDUCTIONS = {
+        "mean": lambda total, value: total + value,
+        "min": min,
+        "max": max
+    }
+
+    def __init__(self, agent_types, model_reporters=None, agent_reporters=None, tables=None, storage_dir=None, chunk_size=65536, cadence=1, reduction="last", writer=None, clock="steps"):
         super().__init__(model_reporters, agent_reporters, tables)
         self.agent_types = agent_types
+        self.storage_dir = storage_dir
+        self.writer = writer
+        self.cadence = cadence
+        self.clock = clock
+        if isinstance(reduction, str):
+            reduction = {name: reduction for name in self.model_reporters}
+        self.reductions = {name: reduction.get(name, "last") for name in self.model_reporters}
+        for name, reduction in self.reductions.items():
+            if reduction != "last" and reduction not in self.REDUCTIONS:
+                raise ValueError(f"Unknown reduction {reduction} of {name}")
+        self.downsampled = self.cadence != 1 or any(reduction != "last" for reduction in self.reductions.values())
+        # observations of the current record and their running reduction
+        self.observations = 0
+        self.window = {}
+        # step of each record, used as index when the records are not one per observation
+        self.steps = []
+        if self.storage_dir is not None:
+            for i, name in enumerate(self.model_vars):
+                self.model_vars[name] = ColumnStore(os.path.join(self.storage_dir, f"model_{i}"), chunk_size, writer)
+            self.steps = ColumnStore(os.path.join(self.storage_dir, "steps"), chunk_size, writer)
+            self._agent_records = ColumnarAgentRecords(self.storage_dir, ["Step", "AgentID"] + list(self.agent_reporters), chunk_size, writer)
+
+    def getModelValue(self, model, reporter):
+        # same dispatch of DataCollector.collect
+        if isinstance(reporter, types.LambdaType) or isinstance(reporter, partial):
+            return reporter(model)
+        elif isinstance(reporter, list):
+            return reporter[0](*reporter[1])
+        return self._reporter_decorator(reporter)
 
-    def _record_agents(self, model):
+    def collect(self, model):
+        """
+        Observe the model, and store a record at the end of the window.
+        """
+        if not self.downsampled:
+            super().collect(model)
+            return
+        self.observations += 1
+        for name, reduction in self.reductions.items():
+            if reduction != "last":
+                value = self.getModelValue(model, self.model_reporters[name])
+                self.window[name] = self.REDUCTIONS[reduction](self.window[name], value) if name in self.window else value
+        if getattr(model.schedule, self.clock) % self.cadence == 0:
+            self.record(model)
+
+    def collectEvent(self, model, agents):
+        """
+        Record the agent reporters of the given agents outside of the cadence, e.g. right before their death.
+        With cadence 1, the agents are already recorded at every observation.
+        """
+        if self.cadence > 1 and self.agent_reporters:
+            self.recordAgents(model, agents)
+
+    def recordAgents(self, model, agents = None):
+        records = list(self._record_agents(model, agents))
+        if self.storage_dir is None:
+            # the records of an event can precede the ones of the same step
+            self._agent_records.setdefault(model.schedule.steps, []).extend(records)
+        else:
+            self._agent_records[model.schedule.steps] = records
+
+    def record(self, model):
+        for name, reduction in self.reductions.items():
+            if reduction == "last":
+                value = self.getModelValue(model, self.model_reporters[name])
+            elif reduction == "mean":
+                value = self.window[name]/self.observations
+            else:
+                value = self.window[name]
+            self.model_vars[name].append(value)
+        if self.agent_reporters:
+            self.recordAgents(model)
+        self.steps.append(model.schedule.steps)
+        self.observations = 0
+        self.window = {}
+
+    def _record_agents(self, model, agents = None):
         """Record agents data in a mapping of functions and agents."""
         rep_funcs = self.agent_reporters.values()
         if all([hasattr(rep, "attribute_name") for rep in rep_funcs]):
@@ -21,10 +314,42 @@ class CustomDataCollector(DataCollector):
                 reports = tuple(rep(agent) for rep in rep_funcs)
                 return _prefix + reports
 
-        agents = []
-        for agent_type in self.agent_types:
-            agents += list(model.schedule.agents_by_type[agent_type].values())
+        if agents is None:
+            agents = chain.from_iterable(model.schedule.agents_by_type[agent_type].values() for agent_type in self.agent_types)
         
         agent_records = map(get_reports, agents)
-        #agents_by_type[self.agent_types]
-        return agent_records
\ No newline at end of file
+        return agent_records
+
+    def flush(self):
+        """
+        Write to disk the values still buffered in memory.
+        """
+        if self.storage_dir is not None:
+            for column in self.model_vars.values():
+                column.flush()
+            self.steps.flush()
+            self._agent_records.flush()
+            if self.writer is not None:
+                self.writer.join()
+
+    def get_model_vars_dataframe(self):
+        if self.storage_dir is None:
+            df = super().get_model_vars_dataframe()
+        else:
+            df = pd.DataFrame({name: column.to_array() for name, column in self.model_vars.items()})
+        if self.downsampled and self.model_reporters:
+            df.index = pd.Index(np.asarray(self.steps[:] if self.storage_dir is not None else self.steps, dtype=np.int64), name="Step")
+        return df
+
+    def get_agent_vars_dataframe(self):
+        if self.storage_dir is None:
+            return super().get_agent_vars_dataframe()
+        names = ["Step", "AgentID"] + list(self.agent_reporters)
+        arrays = [column.to_array() for column in self._agent_records.columns]
+        if len(arrays[0]) == 0:
+            # built as mesa does, so that the empty index has the same dtype as in memory
+            df = pd.DataFrame.from_records(data=[], columns=names)
+        else:
+            df = pd.DataFrame(dict(zip(names, arrays)), columns=names)
+        df = df.set_index(["Step", "AgentID"])
+        return df
@@ -1,16 +1,270 @@
 from mesa.space import MultiGrid
 from mesa.agent import Agent
 from typing import Tuple, Iterable, List
-from bumblebee_pollination_abm.Utils import PlantStage
+from bumblebee_pollination_abm.Utils import PlantStage, PlantType, Season
 import bumblebee_pollination_abm.CustomAgents as CustomAgents
+import numpy as np
 
 Coordinate = Tuple[int, int]
 
 class CustomMultiGrid(MultiGrid):
     def __init__(self, width: int, height: int, torus: bool) -> None:
         super().__init__(width, height, torus)
-    
-        
+        # per-type layers of the cells, each in grid order: plants, bees and colonies
+        self.plants = [[[] for _ in range(self.height)] for _ in range(self.width)]
+        self.bees = [[[] for _ in range(self.height)] for _ in range(self.width)]
+        self.colonies = [[[] for _ in range(self.height)] for _ in range(self.width)]
+        # plants layers split by stage, rebuilt when a plant of the cell changes stage
+        self.seeds = [[[] for _ in range(self.height)] for _ in range(self.width)]
+        # index of flowering plants: for each cell the flowers in grid order,
+        # and the number of flowers of each plant type (indexed by PlantType.value-1)
+        self.flowers = [[[] for _ in range(self.height)] for _ in range(self.width)]
+        self.flower_counts = np.zeros((len(PlantType), self.width, self.height), dtype=np.int32)
+        self.flower_cells = np.zeros((self.width, self.height), dtype=np.int32)
+        # summed-area table of flower_counts, rebuilt lazily when the flowers change
+        self.flower_sat = np.zeros((len(PlantType), self.width+1, self.height+1), dtype=np.int32)
+        self.flower_sat_outdated = False
+        # incremented at every change of the flower index
+        self.flower_index_version = 0
+        # for each radius, the clipped Moore neighborhood spans of every x and y (see get_neighborhood_spans)
+        self.neighborhood_spans = {}
+        # flower queries keyed by (query, pos, include_center, radius), valid for one version of the flower index
+        self.query_cache = {}
+        self.query_cache_version = 0
+        # seed bank: for each plant type and cell the number of seeds waiting to germinate,
+        # with their germination day, generation and sowing day (day_count of the schedule)
+        self.seed_counts = np.zeros((len(PlantType), self.width, self.height), dtype=np.int32)
+        self.seed_germination_day = np.full((len(PlantType), self.width, self.height), -1, dtype=np.int64)
+        self.seed_generation = np.zeros((len(PlantType), self.width, self.height), dtype=np.int32)
+        self.seed_sowing_day = np.full((len(PlantType), self.width, self.height), -1, dtype=np.int64)
+        # season of the plant types sown in the bank
+        self.seed_seasons = {}
+        # for each season and cell, the latest day_count on which a seed or flower had age 0
+        # (their age_origin, or the sowing day of the seed bank): the cell is taken on that day
+        self.season_origin = np.full((len(Season), self.width, self.height), -1, dtype=np.int64)
+
+    def get_layer(self, agent: Agent) -> List[List[List[Agent]]]:
+        if agent.agent_type == "bee":
+            return self.bees
+        if agent.agent_type == "plant":
+            return self.plants
+        if agent.agent_type == "colony":
+            return self.colonies
+        return None
+
+    def place_agent(self, agent: Agent, pos: Coordinate) -> None:
+        super().place_agent(agent, pos)
+        layer = self.get_layer(agent)
+        if layer is not None:
+            cell = layer[pos[0]][pos[1]]
+            if agent not in cell:
+                cell.append(agent)
+        if agent.agent_type == "plant":
+            if agent.plant_stage == PlantStage.FLOWER:
+                self.update_flower_index(pos)
+            elif agent.plant_stage == PlantStage.SEED:
+                self.seeds[pos[0]][pos[1]].append(agent)
+            if agent.plant_stage in (PlantStage.SEED, PlantStage.FLOWER):
+                s = agent.plant_season.value-1
+                self.season_origin[s, pos[0], pos[1]] = max(self.season_origin[s, pos[0], pos[1]], agent.age_origin)
+
+    def remove_agent(self, agent: Agent) -> None:
+        pos = agent.pos
+        super().remove_agent(agent)
+        layer = self.get_layer(agent)
+        if layer is not None:
+            layer[pos[0]][pos[1]].remove(agent)
+        if agent.agent_type == "plant":
+            if agent in self.flowers[pos[0]][pos[1]]:
+                self.update_flower_index(pos)
+            elif agent in self.seeds[pos[0]][pos[1]]:
+                self.seeds[pos[0]][pos[1]].remove(agent)
+            self.update_season_index(pos)
+
+    def update_flower_index(self, pos: Coordinate) -> None:
+        """
+        Rebuild the stage layers and the flowering plant index of a single cell.
+        It must be called every time a plant in the cell becomes a flower or dies.
+        """
+        x, y = pos
+        plants = self.plants[x][y]
+        self.seeds[x][y] = [a for a in plants if a.plant_stage == PlantStage.SEED]
+        flowers = [a for a in plants if a.plant_stage == PlantStage.FLOWER]
+        self.flowers[x][y] = flowers
+        self.flower_counts[:, x, y] = 0
+        for flower in flowers:
+            self.flower_counts[flower.plant_type.value-1, x, y] += 1
+        self.flower_cells[x, y] = len(flowers)
+        self.flower_sat_outdated = True
+        self.flower_index_version += 1
+
+    def update_season_index(self, pos: Coordinate) -> None:
+        """
+        Rebuild the latest age origin of each season of a single cell.
+        It must be called every time the age of a plant in the cell is reset or a plant dies.
+        """
+        x, y = pos
+        origins = self.season_origin[:, x, y]
+        origins[:] = -1
+        for a in self.plants[x][y]:
+            if a.plant_stage in (PlantStage.SEED, PlantStage.FLOWER):
+                s = a.plant_season.value-1
+                origins[s] = max(origins[s], a.age_origin)
+        for plant_type, season in self.seed_seasons.items():
+            t = plant_type.value-1
+            if self.seed_counts[t, x, y] > 0:
+                origins[season.value-1] = max(origins[season.value-1], self.seed_sowing_day[t, x, y])
+
+    def get_flower_sat(self) -> np.ndarray:
+        """
+        Return the per-type summed-area table of the flowering plants.
+        flower_sat[t, i, j] is the number of flowers of type t in the cells with x < i and y < j.
+        """
+        if self.flower_sat_outdated:
+            np.cumsum(self.flower_counts, axis=1, out=self.flower_sat[:, 1:, 1:])
+            np.cumsum(self.flower_sat[:, 1:, 1:], axis=2, out=self.flower_sat[:, 1:, 1:])
+            self.flower_sat_outdated = False
+        return self.flower_sat
+
+    def get_neighborhood_spans(self, radius: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Return (x_min, x_len, y_min, y_len): for each coordinate, the first one and the number of coordinates
+        of the Moore neighborhood of the given radius, clipped to the grid.
+        """
+        spans = self.neighborhood_spans.get(radius)
+        if spans is None:
+            xs = np.arange(self.width, dtype=np.int32)
+            ys = np.arange(self.height, dtype=np.int32)
+            x_min = np.maximum(xs-radius, 0)
+            y_min = np.maximum(ys-radius, 0)
+            x_len = np.minimum(xs+radius, self.width-1)+1-x_min
+            y_len = np.minimum(ys+radius, self.height-1)+1-y_min
+            spans = self.neighborhood_spans[radius] = (x_min, x_len, y_min, y_len)
+        return spans
+
+    def get_random_neighbor(
+        self,
+        pos: Coordinate,
+        random,
+        include_center: bool = False,
+        radius: int = 1
+    ) -> Coordinate:
+        """
+        Draw a uniformly random cell of the Moore neighborhood of pos in constant time.
+        It takes the same draw and returns the same cell as
+        get_neighborhood(pos, True, include_center, radius)[random.randint(0, len(neighborhood))].
+        """
+        if self.torus:
+            neighborhood = self.get_neighborhood(pos, True, include_center, radius)
+            return neighborhood[random.randint(0, len(neighborhood))]
+
+        x, y = pos
+        x_min, x_len, y_min, y_len = self.get_neighborhood_spans(radius)
+        x_min, x_len, y_min, y_len = int(x_min[x]), int(x_len[x]), int(y_min[y]), int(y_len[y])
+        size = x_len*y_len
+        if include_center:
+            i = random.randint(0, size)
+        else:
+            # the cells after the center are shifted by one
+            i = random.randint(0, size-1)
+            if i >= (x-x_min)*y_len + y-y_min:
+                i += 1
+        return (x_min + i // y_len, y_min + i % y_len)
+
+    def get_cached_query(self, key):
+        """
+        Return the cached result of a flower query, or None if the flowers changed since it was cached.
+        """
+        if self.query_cache_version != self.flower_index_version:
+            self.query_cache.clear()
+            self.query_cache_version = self.flower_index_version
+        return self.query_cache.get(key)
+
+    def get_flower_type_counts(
+        self,
+        pos: Coordinate,
+        include_center: bool = False,
+        radius: int = 1
+    ) -> np.ndarray:
+        """
+        Return the number of flowering plants of each type (indexed by PlantType.value-1)
+        in the Moore neighborhood of pos, in constant time.
+        The result is shared by the queries from the same cell and must not be modified.
+        """
+        key = ("counts", pos, include_center, radius)
+        counts = self.get_cached_query(key)
+        if counts is None:
+            counts = self.query_cache[key] = self.compute_flower_type_counts(pos, include_center, radius)
+        return counts
+
+    def compute_flower_type_counts(
+        self,
+        pos: Coordinate,
+        include_center: bool,
+        radius: int
+    ) -> np.ndarray:
+        if self.torus:
+            counts = np.zeros(len(PlantType), dtype=np.int32)
+            for plant in self.get_plant_neighbors(pos, True, include_center, radius):
+                counts[plant.plant_type.value-1] += 1
+            return counts
+
+        x, y = pos
+        x_min, y_min = max(x-radius, 0), max(y-radius, 0)
+        x_max, y_max = min(x+radius, self.width-1)+1, min(y+radius, self.height-1)+1
+        sat = self.get_flower_sat()
+        counts = sat[:, x_max, y_max] - sat[:, x_min, y_max] - sat[:, x_max, y_min] + sat[:, x_min, y_min]
+        if not include_center:
+            counts -= self.flower_counts[:, x, y]
+        return counts
+
+    def sow_seeds(
+        self,
+        pos: Coordinate,
+        plant_type: PlantType,
+        plant_season: Season,
+        germination_day: int,
+        generation: int,
+        sowing_day: int,
+        qty: int = 1
+    ) -> bool:
+        """
+        Add seeds to the seed bank of a cell.
+        Return False, without adding them, if the cell already holds seeds of the same type
+        with a different germination day or generation.
+        """
+        t = plant_type.value-1
+        x, y = pos
+        if self.seed_counts[t, x, y] > 0 and (
+            self.seed_germination_day[t, x, y] != germination_day or 
+            self.seed_generation[t, x, y] != generation
+        ):
+            return False
+        self.seed_counts[t, x, y] += qty
+        self.seed_germination_day[t, x, y] = germination_day
+        self.seed_generation[t, x, y] = generation
+        self.seed_sowing_day[t, x, y] = max(self.seed_sowing_day[t, x, y], sowing_day)
+        self.seed_seasons[plant_type] = plant_season
+        s = plant_season.value-1
+        self.season_origin[s, x, y] = max(self.season_origin[s, x, y], sowing_day)
+        return True
+
+    def pop_germinating_seeds(self, day: int) -> List[Tuple[PlantType, Season, Coordinate, int, int]]:
+        """
+        Remove from the seed bank the seeds germinating by the given day,
+        and return them as (plant_type, plant_season, pos, generation, qty).
+        """
+        germinating = (self.seed_counts > 0) & (self.seed_germination_day <= day)
+        seeds = []
+        for t, x, y in zip(*(idx.tolist() for idx in np.nonzero(germinating))):
+            plant_type = PlantType(t+1)
+            seeds.append((plant_type, self.seed_seasons[plant_type], (x, y), int(self.seed_generation[t, x, y]), int(self.seed_counts[t, x, y])))
+        self.seed_counts[germinating] = 0
+        self.seed_germination_day[germinating] = -1
+        self.seed_generation[germinating] = 0
+        self.seed_sowing_day[germinating] = -1
+        return seeds
+
     def get_neighbor_cells_suitable_for_seeds(
         self,
         areaConstructor,
@@ -18,23 +272,85 @@ class CustomMultiGrid(MultiGrid):
         pos: Coordinate,
         moore: bool,
         include_center: bool = False,
-        radius: int = 1
+        radius: int = 1,
+        day: int = None
     ) -> List[Coordinate]:
+        """
+        Return the cells of the park in the neighborhood without a plant of the season of age 0.
+        When day (the current day_count) is given, the seeds in the bank sown on that day count as plants of age 0,
+        and Moore neighborhoods of a non toroidal grid are answered from the season index.
+        """
+        if day is not None and moore and not self.torus:
+            cells, distances = self.get_seed_cells_window(areaConstructor, plantSeason, pos, include_center, radius, day)
+            return cells
+
         neighborhood = self.get_neighborhood(pos, moore, include_center, radius)
+        seed_types = [t.value-1 for t, season in self.seed_seasons.items() if season == plantSeason and day is not None]
         new_neighborhood = []
         for cell in neighborhood:
             x, y = cell
             len_plants = sum(
-                1 for a in self.grid[x][y] 
-                if a.agent_type == "plant" and 
-                a.plant_stage in (PlantStage.SEED, PlantStage.FLOWER) and 
+                1 for a in self.plants[x][y] 
+                if a.plant_stage in (PlantStage.SEED, PlantStage.FLOWER) and 
                 a.plant_season == plantSeason and 
                 a.age == 0
             )
+            len_plants += sum(1 for t in seed_types if self.seed_sowing_day[t, x, y] == day)
             if len_plants == 0 and areaConstructor.isPointInParkBoundaries((x,y)):
                 new_neighborhood.append(cell)
         return new_neighborhood
 
+    def get_seed_cells_window(
+        self,
+        areaConstructor,
+        plantSeason,
+        pos: Coordinate,
+        include_center: bool,
+        radius: int,
+        day: int
+    ) -> Tuple[List[Coordinate], np.ndarray]:
+        """
+        Return the cells suitable for seeds in the Moore neighborhood, in the order of get_neighborhood,
+        and their distance from pos.
+        """
+        x, y = pos
+        x_min, y_min = max(x-radius, 0), max(y-radius, 0)
+        x_max, y_max = min(x+radius, self.width-1)+1, min(y+radius, self.height-1)+1
+        suitable = areaConstructor.park_mask[x_min:x_max, y_min:y_max] & (self.season_origin[plantSeason.value-1, x_min:x_max, y_min:y_max] != day)
+        if not include_center:
+            suitable[x-x_min, y-y_min] = False
+        i, j = np.nonzero(suitable)
+        distances = np.maximum(np.abs(i+x_min-x), np.abs(j+y_min-y))
+        cells = list(zip((i+x_min).tolist(), (j+y_min).tolist()))
+        return cells, distances
+
+    def get_neighbor_cells_suitable_for_seeds_expanding(
+        self,
+        areaConstructor,
+        plantSeason,
+        pos: Coordinate,
+        qty: int,
+        radius: int,
+        max_radius: int,
+        day: int
+    ) -> List[Coordinate]:
+        """
+        Return the cells suitable for seeds in the smallest Moore neighborhood, from radius up to max_radius,
+        holding at least qty of them, with a single windowed query.
+        """
+        if self.torus:
+            neighbors = self.get_neighbor_cells_suitable_for_seeds(areaConstructor, plantSeason, pos, True, radius = radius, day = day)
+            while len(neighbors) < qty and radius < max_radius:
+                radius += 1
+                neighbors = self.get_neighbor_cells_suitable_for_seeds(areaConstructor, plantSeason, pos, True, radius = radius, day = day)
+            return neighbors
+
+        cells, distances = self.get_seed_cells_window(areaConstructor, plantSeason, pos, False, max(radius, max_radius), day)
+        cumulative = np.cumsum(np.bincount(distances, minlength=max(radius, max_radius)+1))
+        while cumulative[radius] < qty and radius < max_radius:
+            radius += 1
+        return [cell for cell, distance in zip(cells, distances.tolist()) if distance <= radius]
+
 
     
     def get_plant_neighbors(
@@ -42,9 +358,44 @@ class CustomMultiGrid(MultiGrid):
         pos: Coordinate,
         moore: bool,
         include_center: bool = False,
-        radius: int = 1
+        radius: int = 1,
+        plant_type: PlantType = None
     ) -> List[CustomAgents.PlantAgent]:
-        return [n for n in self.get_neighbors(pos, moore, include_center, radius) if n.agent_type == "plant" and n.plant_stage == PlantStage.FLOWER]
+        """
+        Return the flowering plants (of the given type, if any) in the neighborhood, in the same order of get_neighbors.
+        Moore neighborhoods are answered from the flower index, visiting only the cells with flowers.
+        The result is shared by the queries from the same cell and must not be modified.
+        """
+        key = ("flowers", pos, moore, include_center, radius, plant_type)
+        neighbors = self.get_cached_query(key)
+        if neighbors is None:
+            if plant_type is None:
+                neighbors = self.compute_plant_neighbors(pos, moore, include_center, radius)
+            else:
+                neighbors = [n for n in self.get_plant_neighbors(pos, moore, include_center, radius) if n.plant_type == plant_type]
+            self.query_cache[key] = neighbors
+        return neighbors
+
+    def compute_plant_neighbors(
+        self,
+        pos: Coordinate,
+        moore: bool,
+        include_center: bool,
+        radius: int
+    ) -> List[CustomAgents.PlantAgent]:
+        if not moore or self.torus:
+            return self.get_layer_list_contents(self.flowers, self.get_neighborhood(pos, moore, include_center, radius))
+
+        x, y = pos
+        x_min, y_min = max(x-radius, 0), max(y-radius, 0)
+        window = self.flower_cells[x_min:x+radius+1, y_min:y+radius+1]
+        neighbors = []
+        for i, j in zip(*(idx.tolist() for idx in np.nonzero(window))):
+            cell_x, cell_y = x_min+i, y_min+j
+            if not include_center and cell_x == x and cell_y == y:
+                continue
+            neighbors.extend(self.flowers[cell_x][cell_y])
+        return neighbors
 
     
     def get_bumblebee_neighbors(
@@ -54,18 +405,34 @@ class CustomMultiGrid(MultiGrid):
         include_center: bool = False,
         radius: int = 1
     ) -> List[CustomAgents.BeeAgent]:
-        return [n for n in self.get_neighbors(pos, moore, include_center, radius) if n.agent_type == "bee"]
+        return self.get_layer_list_contents(self.bees, self.get_neighborhood(pos, moore, include_center, radius))
+
+    def get_layer_list_contents(
+        self,
+        layer: List[List[List[Agent]]],
+        cell_list: Iterable[Coordinate]
+    ) -> List[Agent]:
+        """
+        Return the agents of a layer in the cells of cell_list, or in the single cell given as a tuple.
+        The list of a single cell is the layer itself and must not be modified.
+        """
+        if isinstance(cell_list, tuple) and len(cell_list) == 2:
+            return layer[cell_list[0]][cell_list[1]]
+        if len(cell_list) == 1:
+            x, y = cell_list[0]
+            return layer[x][y]
+        return [a for x, y in cell_list for a in layer[x][y]]
     
     
     def get_cell_plant_list_contents(
         self, 
         cell_list: Iterable[Coordinate]
     ) -> List[CustomAgents.PlantAgent]:
-        return [a for a in self.get_cell_list_contents(cell_list) if a.agent_type == "plant" and a.plant_stage == PlantStage.FLOWER]
+        return self.get_layer_list_contents(self.flowers, cell_list)
 
     
     def get_cell_bumblebee_list_contents(
         self, 
         cell_list: Iterable[Coordinate]
     ) -> List[CustomAgents.BeeAgent]:
-        return [a for a in self.get_cell_list_contents(cell_list) if a.agent_type == "bee"]
\ No newline at end of file
+        return self.get_layer_list_contents(self.bees, cell_list)
\ No newline at end of file
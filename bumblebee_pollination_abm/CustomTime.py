@@ -2,6 +2,8 @@ from mesa.time import RandomActivationByType
 from mesa.model import Model
 from mesa.agent import Agent
 from typing import List
+from collections import defaultdict
+import heapq
 
 class RandomActivationByTypeOrdered(RandomActivationByType):
     def __init__(self, model: Model, daily_step: int = 0) -> None:
@@ -9,6 +11,87 @@ class RandomActivationByTypeOrdered(RandomActivationByType):
         self.days = 1
         self.years = 0
         self.daily_step = daily_step
+        # agent classes stepped all together by a callable, instead of one agent at a time
+        self.batch_steps = {}
+        # callables run at the start of the daily pass of an agent class, before its agents
+        self.daily_start_steps = {}
+        # agents of each type with some work to do in the per-step pass,
+        # updated when they are added and after their daily step
+        self.active_agents_by_type = defaultdict(dict)
+        # number of daily passes started, the agents ages are counted from it
+        self.day_count = 0
+        self.daily_pass = False
+        # agents of each type that need the daily step every day
+        self.daily_agents_by_type = defaultdict(dict)
+        # event calendar of the other agents: a heap of (day_count, sequence, unique_id) for each type,
+        # with the day currently scheduled for each agent to discard the outdated entries
+        self.event_calendar = defaultdict(list)
+        self.event_days = defaultdict(dict)
+        self.event_sequence = 0
+
+    def add(self, agent: Agent) -> None:
+        super().add(agent)
+        self.update_active(agent)
+        self.update_calendar(agent)
+
+    def remove(self, agent: Agent) -> None:
+        super().remove(agent)
+        agent_class = type(agent)
+        self.active_agents_by_type[agent_class].pop(agent.unique_id, None)
+        self.daily_agents_by_type[agent_class].pop(agent.unique_id, None)
+        self.event_days[agent_class].pop(agent.unique_id, None)
+
+    def update_active(self, agent: Agent) -> None:
+        """
+        Add the agent to the active set of its type if it can act in a step, otherwise remove it.
+        """
+        active_agents = self.active_agents_by_type[type(agent)]
+        if agent.isActive():
+            active_agents[agent.unique_id] = agent
+        else:
+            active_agents.pop(agent.unique_id, None)
+
+    def update_calendar(self, agent: Agent) -> None:
+        """
+        Schedule the next daily step of the agent, on the day_count returned by agent.getNextEventDay(),
+        or every day when it returns None.
+        """
+        agent_class = type(agent)
+        day = agent.getNextEventDay()
+        if day is None:
+            self.event_days[agent_class].pop(agent.unique_id, None)
+            self.daily_agents_by_type[agent_class][agent.unique_id] = agent
+        else:
+            day = max(day, self.day_count+1)
+            self.daily_agents_by_type[agent_class].pop(agent.unique_id, None)
+            self.event_days[agent_class][agent.unique_id] = day
+            heapq.heappush(self.event_calendar[agent_class], (day, self.event_sequence, agent.unique_id))
+            self.event_sequence += 1
+
+    def pop_due_agents(self, type_class: Agent) -> List[str]:
+        """
+        Remove from the event calendar and return the keys of the agents due in the current daily pass.
+        """
+        calendar = self.event_calendar[type_class]
+        event_days = self.event_days[type_class]
+        agent_keys = []
+        while calendar and calendar[0][0] <= self.day_count:
+            day, _, agent_key = heapq.heappop(calendar)
+            if event_days.get(agent_key) == day:
+                del event_days[agent_key]
+                agent_keys.append(agent_key)
+        return agent_keys
+
+    def next_day_of_year(self, day: int) -> int:
+        """
+        Return the day_count of the next daily pass on the given day of the year.
+        """
+        if self.daily_pass:
+            # self.days is the day of the current pass
+            delta = (day - self.days) % self.model.false_year_duration
+            return self.day_count + (delta if delta > 0 else self.model.false_year_duration)
+        # self.days is the day of the next pass
+        return self.day_count + 1 + (day - self.days) % self.model.false_year_duration
 
     def step(self, type_ordered_keys: List[Agent], shuffle_agents: bool = True) -> None:
         """
@@ -26,8 +109,17 @@ class RandomActivationByTypeOrdered(RandomActivationByType):
         else: 
             is_daily_step = False
         for agent_class in type_ordered_keys:
-            self.step_type(agent_class, shuffle_agents=shuffle_agents)
+            if agent_class in self.batch_steps:
+                self.batch_steps[agent_class]()
+            else:
+                self.step_type(agent_class, shuffle_agents=shuffle_agents)
             if is_daily_step:
+                if not self.daily_pass:
+                    # the day starts after the step of the first type
+                    self.daily_pass = True
+                    self.day_count += 1
+                if agent_class in self.daily_start_steps:
+                    self.daily_start_steps[agent_class]()
                 self.daily_step_type(agent_class, shuffle_agents=shuffle_agents)
                 
         if is_daily_step:
@@ -37,22 +129,45 @@ class RandomActivationByTypeOrdered(RandomActivationByType):
                 self.years += 1
             else:
                 self.days += 1
+            self.daily_pass = False
 
         
         self.steps += 1
         self.time += 1
 
+    def step_type(self, type_class: Agent, shuffle_agents: bool = True) -> None:
+        """
+        Shuffle order and run the active agents of a given type.
+
+        Args:
+            type_class: Class object of the type to run.
+        """
+        active_agents = self.active_agents_by_type[type_class]
+        agent_keys: list[int] = list(active_agents.keys())
+        if shuffle_agents:
+            self.model.random.shuffle(agent_keys)
+        for agent_key in agent_keys:
+            # the agent may have been removed by another agent in the same pass
+            agent = active_agents.get(agent_key)
+            if agent is not None:
+                agent.step()
+
     def daily_step_type(self, type_class: Agent, shuffle_agents: bool = True) -> None:
         """
-        Shuffle order and run all agents of a given type.
+        Shuffle order and run the agents of a given type that need a daily step every day,
+        together with the ones due in the event calendar.
         This method is equivalent to the NetLogo 'ask [breed]...'.
 
         Args:
             type_class: Class object of the type to run.
         """
         
-        agent_keys: list[int] = list(self.agents_by_type[type_class].keys())
+        agent_keys: list[int] = list(self.daily_agents_by_type[type_class].keys()) + self.pop_due_agents(type_class)
         if shuffle_agents:
             self.model.random.shuffle(agent_keys)
         for agent_key in agent_keys:
-            self.agents_by_type[type_class][agent_key].dailyStep()
\ No newline at end of file
+            agent = self.agents_by_type[type_class][agent_key]
+            agent.dailyStep()
+            if agent_key in self.agents_by_type[type_class]:
+                self.update_active(agent)
+                self.update_calendar(agent)
\ No newline at end of file
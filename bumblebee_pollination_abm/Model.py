@@ -1,16 +1,40 @@
 from mesa.model import Model
 from bumblebee_pollination_abm.CustomMultiGrid import CustomMultiGrid
-from bumblebee_pollination_abm.Utils import BeeType, BeeStage, PlantStage, PlantType, AreaConstructor, FlowerAreaType, Season
+from bumblebee_pollination_abm.Utils import BeeType, BeeStage, PlantStage, PlantType, AreaConstructor, FlowerAreaType, Season, SEASON_PLANT_TYPES
 from bumblebee_pollination_abm.CustomAgents import PlantAgent, BeeAgent, ColonyAgent, TreeAgent
 from bumblebee_pollination_abm.CustomTime import RandomActivationByTypeOrdered
-from bumblebee_pollination_abm.CustomDataCollector import CustomDataCollector
-from bumblebee_pollination_abm.setup_logger import logger
+from bumblebee_pollination_abm.CustomDataCollector import CustomDataCollector, BackgroundWriter
+from bumblebee_pollination_abm.Aggregates import AggregateRegistry
+from bumblebee_pollination_abm.setup_logger import logger, startBackgroundLogging, stopBackgroundLogging
+from collections import defaultdict
 import numpy as np
+import math
+import os
 
 
+def checkAggregate(model, name, value, scan):
+    """
+    With aggregates_debug, cross-check a reporter read from the aggregates against the full scan.
+    """
+    if model.aggregates.debug:
+        expected = scan(model)
+        # explicit, so that the check is not dropped by python -O
+        if not math.isclose(value, expected, rel_tol=1e-6, abs_tol=1e-6):
+            raise AssertionError(f"{name}: aggregate {value}, scan {expected}")
+    return value
+
 def computeIntraInterPollen(model):
+    if model.aggregates is not None:
+        return checkAggregate(model, "Intra/inter pollen", model.aggregates.getIntraInterPollen(), scanIntraInterPollen)
+    return scanIntraInterPollen(model)
+
+def scanIntraInterPollen(model):
     rs = []
-    active_bumblebees = [a for a in model.schedule.agents_by_type[BeeAgent].values() if a.bee_stage in (BeeStage.BEE, BeeStage.QUEEN) and a.bee_type in (BeeType.QUEEN, BeeType.MALE, BeeType.WORKER)]
+    active_bumblebees = model.getBees(
+        (bee_type, bee_stage) 
+        for bee_type in (BeeType.QUEEN, BeeType.MALE, BeeType.WORKER) 
+        for bee_stage in (BeeStage.BEE, BeeStage.QUEEN)
+    )
     active_plants = [a for a in model.schedule.agents_by_type[PlantAgent].values() if a.plant_stage == PlantStage.FLOWER]
     if len(active_plants) == 0:
         return 0
@@ -24,11 +48,7 @@ def computeIntraInterPollen(model):
 
         types = {}
         for t in plant_types:
-            types[t] = 0
-
-        for t, _ in agent.rewarded_memory:
-            if t in types:
-                types[t] += 1
+            types[t] = agent.rewarded_memory.getCount(t)
 
         max_types = len(plant_types)
         max_length = agent.max_memory
@@ -43,6 +63,11 @@ def computeIntraInterPollen(model):
     return sum(rs)/len(rs) if len(rs) > 0 else 0
 
 def computeSeedProducingProbability(model):
+    if model.aggregates is not None:
+        return checkAggregate(model, "Seed Probability", model.aggregates.getSeedProducingProbability(), scanSeedProducingProbability)
+    return scanSeedProducingProbability(model)
+
+def scanSeedProducingProbability(model):
     probs = 0
     count = 0
     for agent in model.schedule.agents_by_type[PlantAgent].values():
@@ -53,6 +78,11 @@ def computeSeedProducingProbability(model):
     return probs/count if count > 0 else 0
 
 def computPlantNectarAverage(model):
+    if model.aggregates is not None:
+        return checkAggregate(model, "Plant Nectar Average", model.aggregates.getPlantNectarAverage(), scanPlantNectarAverage)
+    return scanPlantNectarAverage(model)
+
+def scanPlantNectarAverage(model):
     nectar = 0
     count = 0
     for agent in model.schedule.agents_by_type[PlantAgent].values():
@@ -63,6 +93,11 @@ def computPlantNectarAverage(model):
     return nectar/count if count > 0 else 0
 
 def computPlantPollenAverage(model):
+    if model.aggregates is not None:
+        return checkAggregate(model, "Plant Pollen Average", model.aggregates.getPlantPollenAverage(), scanPlantPollenAverage)
+    return scanPlantPollenAverage(model)
+
+def scanPlantPollenAverage(model):
     pollen = 0
     count = 0
     for agent in model.schedule.agents_by_type[PlantAgent].values():
@@ -171,7 +206,19 @@ class GreenArea(Model):
             "pollen_consumption_per_bee": 0.7,
             "days_till_death": 4
         },
-        seed = 23
+        seed = 23,
+        cohort_brood = False,
+        aggregated_nest_bees = False,
+        seed_bank = False,
+        landscape = None,
+        foraging_macro_steps = 0, # steps of foraging trip run by each bee in a single call, 0 to step the bees one step at a time
+        aggregates_debug = False, # cross-check the reporters read from the running aggregates against full scans
+        data_collection_dir = None, # directory where the collected data are streamed, None to keep them in memory
+        data_collection_cadence = 1, # steps of each record of the bee and plant reporters
+        data_collection_reduction = "last", # reduction of the bee and plant reporters over the steps of a record: last, mean, min or max
+        colony_collection_cadence = 1, # days of each record of the colonies, also recorded before a colony dies when greater than 1
+        background_io = False, # write the collected data chunks and the log records from background threads, see flushOutput
+        background_queue_size = 64 # chunks of collected data waiting to be written before the collection blocks
     ):
         """ """
         #parameters
@@ -193,11 +240,51 @@ class GreenArea(Model):
         self.plant_params = plant_params
         self.colony_params = colony_params
         self.data_collection = data_collection
+        self.cohort_brood = cohort_brood
+        self.aggregated_nest_bees = aggregated_nest_bees
+        self.seed_bank = seed_bank
+        if foraging_macro_steps > 0 and steps_per_day % foraging_macro_steps != 0:
+            # a trip call would straddle the daily pass, with stale stages and ages of the bees
+            raise ValueError(f"steps_per_day ({steps_per_day}) must be a multiple of foraging_macro_steps ({foraging_macro_steps})")
+        self.foraging_macro_steps = foraging_macro_steps
+        self.data_collection_dir = data_collection_dir
+        self.data_collection_cadence = data_collection_cadence
+        self.data_collection_reduction = data_collection_reduction
+        self.colony_collection_cadence = colony_collection_cadence
+        self.background_io = background_io
+        # the collected data are only written to disk with data_collection_dir
+        if self.background_io and self.data_collection and self.data_collection_dir is not None:
+            self.background_writer = BackgroundWriter(background_queue_size)
+        else:
+            self.background_writer = None
 
-        self.areaConstructor = AreaConstructor(self.flower_area_type, self.height, self.width, self.no_mow_pc)
+        if landscape is not None:
+            # e.g. a RasterAreaConstructor, the grid takes its size
+            self.areaConstructor = landscape
+            self.width = landscape.width
+            self.height = landscape.height
+        else:
+            self.areaConstructor = AreaConstructor(self.flower_area_type, self.height, self.width, self.no_mow_pc)
 
         self.schedule = RandomActivationByTypeOrdered(self, self.steps_per_day)
-        self.grid = CustomMultiGrid(width, height, torus=False)
+        self.grid = CustomMultiGrid(self.width, self.height, torus=False)
+        # live bees indexed by (bee_type, bee_stage), and the queens available for mating
+        self.bees_by_type_stage = defaultdict(dict)
+        self.unmated_queens = {}
+
+        if self.foraging_macro_steps > 0:
+            # bees run several steps of their trips at once, depositing their pollen along the way
+            self.schedule.batch_steps[BeeAgent] = self.stepForagingTrips
+
+        # plants recharge lazily, their step is only the pollen deposition of the bees
+        self.schedule.batch_steps[PlantAgent] = self.depositPollen
+
+        if self.seed_bank:
+            # the seeds germinate before the plant daily pass, as the seed agents bloom in it
+            self.schedule.daily_start_steps[PlantAgent] = self.germinateSeeds
+
+        # running sums of the reporters, kept only when they are collected
+        self.aggregates = AggregateRegistry(self, aggregates_debug) if self.data_collection else None
 
         if self.data_collection:
             self.datacollector_colonies = CustomDataCollector(
@@ -205,11 +292,19 @@ class GreenArea(Model):
                 agent_reporters={
                     "Nectar": "nectar",
                     "Pollen": "pollen"
-                }
+                },
+                storage_dir=self.getDataCollectionDir("colonies"),
+                writer=self.background_writer,
+                cadence=self.colony_collection_cadence,
+                clock="day_count"
             )
             self.datacollector_bumblebees = CustomDataCollector(
                 [BeeAgent],
                 model_reporters={"Intra/inter pollen": computeIntraInterPollen},
+                storage_dir=self.getDataCollectionDir("bumblebees"),
+                writer=self.background_writer,
+                cadence=self.data_collection_cadence,
+                reduction=self.data_collection_reduction
             )
 
             self.datacollector_plants = CustomDataCollector(
@@ -218,7 +313,11 @@ class GreenArea(Model):
                     "Seed Probability": computeSeedProducingProbability,
                     "Plant Nectar Average": computPlantNectarAverage,
                     "Plant Pollen Average": computPlantPollenAverage
-                }
+                },
+                storage_dir=self.getDataCollectionDir("plants"),
+                writer=self.background_writer,
+                cadence=self.data_collection_cadence,
+                reduction=self.data_collection_reduction
             )
 
         # Set up agents
@@ -230,7 +329,6 @@ class GreenArea(Model):
         self.colony_id = 0
         self.tree_id = 0
         self.plant_types_quantity = 2
-        (r_max, t_max, l_max, d_max), wood_surface = self.areaConstructor.getWoodBoundsAndSurface()
         self.createAllPlants()
                 
         self.createAllBumblebees()
@@ -242,6 +340,11 @@ class GreenArea(Model):
             self.datacollector_bumblebees.collect(self)
             self.datacollector_plants.collect(self)
 
+    def getDataCollectionDir(self, name):
+        if self.data_collection_dir is None:
+            return None
+        return os.path.join(self.data_collection_dir, name)
+
     def createAllBumblebees(self):
         for _ in np.arange(self.queens_quantity):
             # metti i nidi dei bombi ai bordi del parco dove c'è il bosco 
@@ -261,18 +364,45 @@ class GreenArea(Model):
             self.schedule.add(queen_agent)
 
     def createAllPlants(self):
-        for _, x, y in self.grid.coord_iter():
-            if self.areaConstructor.isPointInFlowerArea((x,y)):
-                self.createPlantAgents(x, y)
-
-            if (self.woods_drawing and self.areaConstructor.isPointInWoodsArea((x,y))):
+        flower_area = self.areaConstructor.flower_area_mask
+        woods = self.areaConstructor.woods_mask if self.woods_drawing else np.zeros_like(flower_area)
+        plant_types = None
+        if self.areaConstructor.plant_type_probabilities is not None:
+            plant_types = self.drawPlantTypes(self.areaConstructor.plant_type_probabilities)
+        # cells visited in the order of coord_iter
+        for x, y in zip(*(idx.tolist() for idx in np.nonzero(flower_area | woods))):
+            if flower_area[x, y]:
+                if plant_types is not None:
+                    self.createPlantAgents(x, y, [(plant_types[season][x][y], season) for season in Season])
+                else:
+                    self.createPlantAgents(x, y)
+
+            if woods[x, y]:
                 # solo per poter disegnare il bosco
                 tree_agent = TreeAgent(self.tree_id, self)
                 self.grid.place_agent(tree_agent, (x, y))
                 self.schedule.add(tree_agent)
                 self.tree_id += 1
 
-    def createPlantAgents(self, x, y):
+    def drawPlantTypes(self, probabilities):
+        """
+        Draw at once the plant type of each season for every cell,
+        from the per-cell probabilities of the plant types within their season.
+        """
+        plant_types = {}
+        for season in Season:
+            types = SEASON_PLANT_TYPES[season]
+            cumulative = np.cumsum(np.asarray(probabilities)[[t.value-1 for t in types]], axis=0)
+            rand = self.random.random_sample((self.width, self.height))
+            choice = np.minimum((rand[None] >= cumulative).sum(axis=0), len(types)-1)
+            plant_types[season] = np.array(types, dtype=object)[choice].tolist()
+        return plant_types
+
+    def createPlantAgents(self, x, y, plant_types = None):
+        if plant_types is not None:
+            self.createPlants(x, y, plant_types)
+            return
+
         plant_types = []
         
         rand = self.random.random()
@@ -299,7 +429,14 @@ class GreenArea(Model):
         else:
             plant_types.append((PlantType.AUTUMN_TYPE3, Season.AUTUMN))
             
+        self.createPlants(x, y, plant_types)
+
+    def createPlants(self, x, y, plant_types):
         for plant_type, plant_season in plant_types:
+            if self.seed_bank and self.seed_max_age[plant_type] > 0:
+                # seeds wait in the seed bank of the grid until they germinate
+                self.grid.sow_seeds((x, y), plant_type, plant_season, self.seed_max_age[plant_type], 1, self.schedule.day_count)
+                continue
             agent = PlantAgent(
                 self.plant_id, 
                 self, 
@@ -328,10 +465,54 @@ class GreenArea(Model):
             self.datacollector_bumblebees.collect(self)
             self.datacollector_plants.collect(self)
 
+    def depositPollen(self):
+        """
+        Plant phase driven by the bees: only the cells occupied by a bee are visited,
+        and their flowers receive the pollen of the bees in grid order.
+        In the macro-step mode, the active bees deposit their pollen during their trips,
+        but for the last step of each call, so between the calls only the other bees are left.
+        """
+        bees = self.schedule.agents_by_type[BeeAgent]
+        in_trip = None
+        if self.foraging_macro_steps > 0 and self.schedule.steps % self.foraging_macro_steps != 0:
+            in_trip = self.schedule.active_agents_by_type[BeeAgent]
+        cells = {bee.pos for bee in bees.values() if in_trip is None or bee.unique_id not in in_trip}
+        for x, y in cells:
+            flowers = self.grid.flowers[x][y]
+            if flowers:
+                bumblebees = self.grid.get_cell_bumblebee_list_contents([(x, y)])
+                if in_trip is not None:
+                    bumblebees = [bee for bee in bumblebees if bee.unique_id not in in_trip]
+                for plant in flowers:
+                    plant.receivePollen(bumblebees)
+
+    def stepForagingTrips(self):
+        """
+        Bee phase of the macro-step mode: every foraging_macro_steps steps, the active bees in random order
+        run, one bee at a time, all their foraging steps since the previous call.
+        steps_per_day is a multiple of foraging_macro_steps, so the daily pass always follows a call.
+        Plant resources recharge up to the current step, so the interleaving of the bees at the same flowers
+        is exact only at the granularity of the calls.
+        """
+        steps = self.schedule.steps
+        if steps % self.foraging_macro_steps != 0:
+            return
+        first_step = max(steps - self.foraging_macro_steps + 1, 0)
+        active_bees = self.schedule.active_agents_by_type[BeeAgent]
+        bee_keys = list(active_bees.keys())
+        self.random.shuffle(bee_keys)
+        for bee_key in bee_keys:
+            bee = active_bees.get(bee_key)
+            if bee is not None:
+                bee.tripStep(first_step, steps+1)
+
     def dailyStep(self):
         if self.data_collection:
             self.datacollector_colonies.collect(self)
-        
+
+        if self.aggregates is not None:
+            self.aggregates.rebuild(self.schedule.agents_by_type[PlantAgent].values(), self.schedule.agents_by_type[BeeAgent].values())
+
         # dezanzarizzazione con conseguente stordimento del bombo
         if (self.schedule.days % self.pesticide_days == 0):
             self.pesticideEffects()
@@ -342,20 +523,17 @@ class GreenArea(Model):
 
     
     def pesticideEffects(self):
-        for bumblebee in self.schedule.agents_by_type[BeeAgent].values():
-            if bumblebee.bee_stage == BeeStage.BEE and bumblebee.bee_type == BeeType.WORKER:
-                bumblebee.pesticideConfusion()
+        for bumblebee in self.getBees([(BeeType.WORKER, BeeStage.BEE)]):
+            bumblebee.pesticideConfusion()
 
 
     
     def mowPark(self):
-        for cell in self.grid.coord_iter():
-            x = cell[1]
-            y = cell[2]
-            if not self.areaConstructor.isPointInFlowerArea((x,y)):
-                plants = [a for a in self.grid[x][y] if a.agent_type == "plant" and a.plant_stage == PlantStage.FLOWER]
-                for plant in plants:
-                    plant.setPlantDead()
+        # only the mowable cells with flowers
+        mowed = self.areaConstructor.mowable_mask & (self.grid.flower_cells > 0)
+        for x, y in zip(*(idx.tolist() for idx in np.nonzero(mowed))):
+            for plant in list(self.grid.flowers[x][y]):
+                plant.setPlantDead()
 
     def createNewFlowers(self, qty: int, parent: PlantAgent, seed_age: int, generation: int):
         # parto dal neighborhood del fiore per mettere i semi
@@ -368,6 +546,15 @@ class GreenArea(Model):
 
         for i in np.arange(qty):
             x, y = neighbors[i]
+            if self.seed_bank and seed_age > 0 and self.grid.sow_seeds(
+                (x, y), 
+                parent.plant_type, 
+                parent.plant_season, 
+                self.schedule.day_count + seed_age, 
+                generation, 
+                self.schedule.day_count
+            ):
+                continue
             agent = PlantAgent(
                 self.plant_id, 
                 self, 
@@ -386,41 +573,72 @@ class GreenArea(Model):
         #self.log(f"Day {self.schedule.days}: Created {qty} plants of type {parent.plant_type.name}, and seed age of {seed_age} days")
 
     
-    def getFlowerNeighbors(self, qty, parent, radius):
-        neighbors = self.grid.get_neighbor_cells_suitable_for_seeds(self.areaConstructor, parent.plant_season, parent.pos, True, radius = radius)
-
-        while len(neighbors) < qty and radius < 10:
-            #self.log("infinite loop potential")
-            radius += 1
-            neighbors = self.grid.get_neighbor_cells_suitable_for_seeds(self.areaConstructor, parent.plant_season, parent.pos, True, radius = radius)
+    def germinateSeeds(self):
+        # the seeds of the bank become flowers on their germination day
+        for plant_type, plant_season, pos, generation, qty in self.grid.pop_germinating_seeds(self.schedule.day_count):
+            for _ in range(qty):
+                agent = PlantAgent(
+                    self.plant_id, 
+                    self, 
+                    reward = self.plant_reward[plant_type], 
+                    plant_type = plant_type, 
+                    plant_season = plant_season,
+                    plant_stage = PlantStage.FLOWER, 
+                    seed_age = 0,
+                    gen_number = generation,
+                    **self.plant_params
+                )
+                self.plant_id += 1
+                self.grid.place_agent(agent, pos)
+                self.schedule.add(agent)
 
-        return neighbors
+    def getFlowerNeighbors(self, qty, parent, radius):
+        # the radius grows up to 10 until there are enough cells
+        return self.grid.get_neighbor_cells_suitable_for_seeds_expanding(
+            self.areaConstructor, 
+            parent.plant_season, 
+            parent.pos, 
+            qty, 
+            radius, 
+            10, 
+            self.schedule.day_count
+        )
 
     def createNewBumblebees(self, qty, bumblebee_type: BeeType, parent: BeeAgent):
+        if parent.colony.cohort_brood or (bumblebee_type == BeeType.NEST_BEE and parent.colony.aggregated_nest_bees):
+            parent.colony.addBrood(bumblebee_type, qty)
+            return
+
         for _ in np.arange (qty):
-            self.bumblebee_params["max_collection_ratio"] = self.random.uniform(0.8, 1)
-            bumblebee = BeeAgent(
-                self.bee_id, 
-                self, 
-                bumblebee_type, 
-                BeeStage.EGG, 
-                parent.colony,
-                **self.bumblebee_params
-            )
-            parent.colony.addNewBee(bumblebee)
-            self.bee_id += 1
-            self.grid.place_agent(bumblebee, parent.colony.pos)
-            self.schedule.add(bumblebee)
+            self.createBumblebee(bumblebee_type, BeeStage.EGG, parent.colony)
+
+    def createBumblebee(self, bumblebee_type: BeeType, bumblebee_stage: BeeStage, colony: ColonyAgent):
+        self.bumblebee_params["max_collection_ratio"] = self.random.uniform(0.8, 1)
+        bumblebee = BeeAgent(
+            self.bee_id, 
+            self, 
+            bumblebee_type, 
+            bumblebee_stage, 
+            colony,
+            **self.bumblebee_params
+        )
+        colony.addNewBee(bumblebee)
+        self.bee_id += 1
+        self.grid.place_agent(bumblebee, colony.pos)
+        self.schedule.add(bumblebee)
+        return bumblebee
 
     def createNewColony(self, queen):
         pos = self.getNewColonyPosition()
 
-        if queen.nectar > 19 and sum(queen.pollen.values()) > 20:
+        if queen.nectar > 19 and queen.pollen_total > 20:
             self.colony_params["days_till_death"] = 6
         
         colony_agent = ColonyAgent(
             self.colony_id, 
             self,
+            cohort_brood = self.cohort_brood,
+            aggregated_nest_bees = self.aggregated_nest_bees,
             **self.colony_params
         )
         self.colony_id += 1
@@ -452,18 +670,58 @@ class GreenArea(Model):
 
         return pos
 
+    def indexBee(self, bee):
+        self.bees_by_type_stage[(bee.bee_type, bee.bee_stage)][bee.unique_id] = bee
+        if bee.bee_type == BeeType.QUEEN and bee.bee_stage == BeeStage.BEE and not bee.mated:
+            self.unmated_queens[bee.unique_id] = bee
+        if self.aggregates is not None:
+            self.aggregates.indexBee(bee)
+
+    def unindexBee(self, bee):
+        self.bees_by_type_stage[(bee.bee_type, bee.bee_stage)].pop(bee.unique_id, None)
+        self.unmated_queens.pop(bee.unique_id, None)
+        if self.aggregates is not None:
+            self.aggregates.unindexBee(bee)
+
+    def getBees(self, keys):
+        """
+        Return the live bees with the given (bee_type, bee_stage) keys.
+        """
+        return [bee for key in keys for bee in self.bees_by_type_stage[key].values()]
+
     def removeDeceasedAgent(self, agent):
+        if agent.agent_type == "colony" and self.data_collection:
+            # the colony is recorded a last time
+            self.datacollector_colonies.collectEvent(self, [agent])
         self.grid.remove_agent(agent)
         self.schedule.remove(agent)
+        if agent.agent_type == "bee":
+            self.unindexBee(agent)
+        if agent.agent_type == "plant" and self.aggregates is not None:
+            self.aggregates.removePlant(agent)
         if(agent.agent_type == "colony"):
             self.log(f"Colony {agent.unique_id} died")
 
     def log(self, message):
+        if self.background_io:
+            startBackgroundLogging()
         logger.info(message)
 
+    def flushOutput(self):
+        """
+        Write to disk the collected data and the log records still buffered, at the end of a run.
+        """
+        if self.data_collection:
+            self.datacollector_colonies.flush()
+            self.datacollector_bumblebees.flush()
+            self.datacollector_plants.flush()
+        if self.background_writer is not None:
+            self.background_writer.close()
+        if self.background_io:
+            stopBackgroundLogging()
+
     def getHibernatedQueensQuantity(self):
-        queens = [a for a in self.schedule.agents_by_type[BeeAgent].values() if a.bee_type == BeeType.QUEEN and a.bee_stage == BeeStage.HIBERNATION]
-        return len(queens)
+        return len(self.bees_by_type_stage[(BeeType.QUEEN, BeeStage.HIBERNATION)])
     
     def getColoniesPositions(self):
         positions = [a.pos for a in self.schedule.agents_by_type[ColonyAgent].values()]
@@ -0,0 +1,106 @@
+import concurrent.futures as futures
+import itertools
+import copy
+import os
+import numpy as np
+from bumblebee_pollination_abm.Model import GreenArea, computeSeedProducingProbability, computeIntraInterPollen
+from bumblebee_pollination_abm.CustomAgents import ColonyAgent, PlantAgent
+from bumblebee_pollination_abm.Utils import PlantStage
+
+
+def getParameterGrid(grid):
+    """
+    Every combination of the values of grid, a dict of lists by parameter name.
+    """
+    names = list(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+
+
+def sampleParameters(ranges, samples, seed = 0):
+    """
+    Random design of samples parameter records: a (low, high) tuple is sampled uniformly,
+    with integers when both bounds are ints, a list is sampled among its values.
+    """
+    random = np.random.RandomState(seed)
+    design = [{} for _ in range(samples)]
+    for name, values in ranges.items():
+        if isinstance(values, tuple):
+            low, high = values
+            if isinstance(low, int) and isinstance(high, int):
+                drawn = [int(v) for v in random.randint(low, high + 1, samples)]
+            else:
+                drawn = [float(v) for v in random.uniform(low, high, samples)]
+        else:
+            drawn = [values[i] for i in random.randint(0, len(values), samples)]
+        for record, value in zip(design, drawn):
+            record[name] = value
+    return design
+
+
+def getRunRecords(design, seeds, steps):
+    """
+    One (run_id, params, seed, steps) record for every point of the design and every replicate seed.
+    """
+    return [(run_id, params, seed, steps) for run_id, (params, seed) in enumerate(itertools.product(design, seeds))]
+
+
+def runModel(base_params, record):
+    """
+    Build the model of a run record from the base parameters, run it and return its results.
+    With a data_collection_dir, the run writes its data in its run_<run_id> subdirectory.
+    """
+    run_id, params, seed, steps = record
+    # GreenArea writes into the nested parameter dicts, the runs of a chunk must not share them
+    run_params = copy.deepcopy({**base_params, **params, "seed": seed})
+    if run_params.get("data_collection_dir") is not None:
+        # each run streams its data to its own subdirectory
+        run_params["data_collection_dir"] = os.path.join(run_params["data_collection_dir"], f"run_{run_id:05d}")
+    model = GreenArea(**run_params)
+    for _ in range(steps):
+        model.step()
+    model.flushOutput()
+    return {
+        "run_id": run_id,
+        "seed": seed,
+        **params,
+        "hibernated_queens": model.getHibernatedQueensQuantity(),
+        "colonies_founded": model.colony_id,
+        "colonies_alive": len(model.schedule.agents_by_type[ColonyAgent]),
+        "flowers": sum(1 for plant in model.schedule.agents_by_type[PlantAgent].values() if plant.plant_stage == PlantStage.FLOWER),
+        "seed_probability": computeSeedProducingProbability(model),
+        "intra_inter_pollen": computeIntraInterPollen(model)
+    }
+
+
+def runChunk(base_params, records):
+    # runs in the worker: only the parameter records are sent by the parent
+    results = []
+    for record in records:
+        try:
+            results.append(runModel(base_params, record))
+        except Exception as ex:
+            run_id, params, seed, _ = record
+            results.append({"run_id": run_id, "seed": seed, **params, "error": repr(ex)})
+    return results
+
+
+def runSweep(base_params, design, seeds, steps, max_workers = 8, chunk_size = 1, max_pending = None):
+    """
+    Run every point of design (e.g. from getParameterGrid or sampleParameters) with every seed
+    in a pool of max_workers processes, yielding the result of each run as soon as its chunk completes.
+    Runs are submitted in chunks of chunk_size records, with at most max_pending chunks
+    (2*max_workers by default) submitted at once, so that thousands of runs are not queued all together.
+    """
+    records = getRunRecords(design, seeds, steps)
+    chunks = [records[i:i+chunk_size] for i in range(0, len(records), chunk_size)]
+    max_pending = max_pending if max_pending is not None else 2*max_workers
+    with futures.ProcessPoolExecutor(max_workers=max_workers) as executor:
+        pending = set()
+        next_chunk = 0
+        while next_chunk < len(chunks) or pending:
+            while next_chunk < len(chunks) and len(pending) < max_pending:
+                pending.add(executor.submit(runChunk, base_params, chunks[next_chunk]))
+                next_chunk += 1
+            done, pending = futures.wait(pending, return_when=futures.FIRST_COMPLETED)
+            for future in done:
+                yield from future.result()
@@ -1,6 +1,8 @@
 from enum import Enum
 from math import floor, sqrt, pi
 from typing import Tuple
+import os
+import numpy as np
 
 class ColonySize(Enum):
     SMALL = 1
@@ -53,16 +55,123 @@ class Season(Enum):
     SUMMER = 2
     AUTUMN = 3
 
+SEASON_PLANT_TYPES = {
+    Season.SPRING: (PlantType.SPRING_TYPE1, PlantType.SPRING_TYPE2, PlantType.SPRING_TYPE3),
+    Season.SUMMER: (PlantType.SUMMER_TYPE1, PlantType.SUMMER_TYPE2, PlantType.SUMMER_TYPE3),
+    Season.AUTUMN: (PlantType.AUTUMN_TYPE1, PlantType.AUTUMN_TYPE2, PlantType.AUTUMN_TYPE3)
+}
+
+class RewardedMemory():
+    """
+    Fixed-capacity ring buffer of the rewards (plant_type, reward) received by a bee,
+    keeping the running sum and count of the rewards of each plant type.
+    When the memory is full, the oldest reward is evicted.
+    """
+
+    def __init__(self, max_memory) -> None:
+        self.max_memory = max_memory
+        self.clear()
+
+    def __len__(self):
+        return self.length
+
+    def __iter__(self):
+        for i in range(self.length):
+            yield self.rewards[(self.start+i) % self.max_memory]
+
+    def clear(self):
+        self.rewards = [None]*self.max_memory
+        self.start = 0
+        self.length = 0
+        self.sums = {}
+        self.counts = {}
+
+    def resize(self, max_memory):
+        # keep the most recent rewards
+        rewards = list(self)[-max_memory:] if max_memory > 0 else []
+        self.max_memory = max_memory
+        self.clear()
+        for plant_type, reward in rewards:
+            self.push(plant_type, reward)
+
+    def push(self, plant_type, reward):
+        if self.max_memory == 0:
+            return
+        if self.length == self.max_memory:
+            self.evict()
+        self.rewards[(self.start+self.length) % self.max_memory] = (plant_type, reward)
+        self.length += 1
+        self.counts[plant_type] = self.counts.get(plant_type, 0) + 1
+        self.sums[plant_type] = self.sums.get(plant_type, 0) + reward
+
+    def evict(self):
+        plant_type, reward = self.rewards[self.start]
+        self.rewards[self.start] = None
+        self.start = (self.start+1) % self.max_memory
+        self.length -= 1
+        self.counts[plant_type] -= 1
+        if self.counts[plant_type] == 0:
+            del self.counts[plant_type]
+            del self.sums[plant_type]
+        else:
+            self.sums[plant_type] -= reward
+
+    def getCount(self, plant_type):
+        return self.counts.get(plant_type, 0)
+
+    def getMeanReward(self, plant_type):
+        if plant_type not in self.counts:
+            return 0
+        return self.sums[plant_type]/self.counts[plant_type]
+
+    def getMeanRewards(self):
+        return {plant_type: self.sums[plant_type]/count for plant_type, count in self.counts.items()}
+
 class AreaConstructor():
     def __init__(self, area_type: FlowerAreaType, height, width, no_mow_pc) -> None:
         self.no_mow_pc = no_mow_pc
         self.height = height
         self.width = width
         self.area_type = area_type
+        # per-cell probability of each plant type (indexed by PlantType.value-1) within its season,
+        # None to draw the plant types of each cell with the default thresholds
+        self.plant_type_probabilities = None
+        self.buildLandscape()
+
+    def buildLandscape(self):
+        """
+        Build the flower area of the area type, the park boundaries and the landscape rasters.
+        """
         self.getCoordinateFunction = getattr(self, f"getCoordForPlants{self.area_type}")
         self.coords = self.getCoordinateFunction()
-        self.isPointInFlowerArea = getattr(self, f"isPointInFlowerArea{self.area_type}")
+        self.isPointInFlowerAreaShape = getattr(self, f"isPointInFlowerArea{self.area_type}")
         self.parkBoundaries = self.getParkBoundaries()
+        self.buildMasks()
+
+    def buildMasks(self):
+        """
+        Build the boolean rasters of the landscape, indexed by [x, y].
+        """
+        (r_max, t_max, l_max, d_max), _ = self.getWoodBoundsAndSurface()
+        x = np.arange(self.width)[:, None]
+        y = np.arange(self.height)[None, :]
+        (x_min, y_min), (x_max, y_max) = self.parkBoundaries
+        self.park_mask = (x >= x_min) & (x <= x_max) & (y >= y_min) & (y <= y_max)
+        self.woods_mask = (x <= l_max-1) | (x >= self.width-r_max) | (y <= d_max-1) | (y >= self.height-t_max)
+        self.flower_area_mask = np.array([
+            [self.isPointInFlowerAreaShape((i, j)) for j in range(self.height)] 
+            for i in range(self.width)
+        ], dtype=bool).reshape(self.width, self.height)
+        # flowers outside the flower area are cut when the park is mowed
+        self.mowable_mask = ~self.flower_area_mask
+
+    def isInside(self, point):
+        return 0 <= point[0] < self.width and 0 <= point[1] < self.height
+
+    def isPointInFlowerArea(self, point):
+        if self.isInside(point):
+            return bool(self.flower_area_mask[point[0], point[1]])
+        return self.isPointInFlowerAreaShape(point)
 
     def getWoodBoundsAndSurface(self):
         r_max = 5
@@ -195,9 +304,13 @@ class AreaConstructor():
 
 
     def isPointInParkBoundaries(self, point):
+        if self.isInside(point):
+            return bool(self.park_mask[point[0], point[1]])
         return self.inside_square(point, self.parkBoundaries[0], self.parkBoundaries[1])
     
     def isPointInWoodsArea(self, point: Tuple[int, int]):
+        if self.isInside(point):
+            return bool(self.woods_mask[point[0], point[1]])
         (r_max, t_max, l_max, d_max), wood_surface = self.getWoodBoundsAndSurface()
         x, y = point
         return (x <= l_max-1 or x >= self.width-r_max or y <= d_max-1 or y >= self.height-t_max)
@@ -218,4 +331,82 @@ class AreaConstructor():
             x = random.randint(0, self.width)
             y = random.randint(0, d_max)
         
-        return (x,y)
\ No newline at end of file
+        return (x,y)
+
+class RasterAreaConstructor(AreaConstructor):
+    """
+    Landscape loaded from boolean rasters indexed by [x, y], given as arrays or as paths of .npy files.
+    Files are memory-mapped, and a pickled constructor only keeps their paths,
+    so that large rasters are not copied into every worker process.
+    plant_type_probabilities has shape (len(PlantType), width, height): for each cell,
+    the probability of each plant type within its season.
+    There is no flower area type: area_type and coords are None, no_mow_pc is the share of the cells
+    outside the woods in the flower area, and parkBoundaries is the bounding box of the park mask.
+    The shape functions of AreaConstructor (getCoordForPlants*, isPointInFlowerArea1-7, getWoodBoundsAndSurface)
+    describe the built-in landscapes only and are not supported.
+    """
+    def __init__(self, flower_area, park, woods, plant_type_probabilities = None, mmap_mode = "r") -> None:
+        self.sources = (flower_area, park, woods, plant_type_probabilities)
+        self.mmap_mode = mmap_mode
+        # the size and no_mow_pc are given by the rasters
+        super().__init__(None, None, None, None)
+
+    def buildLandscape(self):
+        self.loadRasters()
+
+    def loadRaster(self, source):
+        if source is None:
+            return None
+        if isinstance(source, (str, os.PathLike)):
+            return np.load(source, mmap_mode=self.mmap_mode)
+        return np.asarray(source)
+
+    def loadRasters(self):
+        flower_area, park, woods, plant_type_probabilities = (self.loadRaster(source) for source in self.sources)
+        self.flower_area_mask = flower_area if flower_area.dtype == bool else flower_area != 0
+        self.park_mask = park if park.dtype == bool else park != 0
+        self.woods_mask = woods if woods.dtype == bool else woods != 0
+        self.mowable_mask = ~self.flower_area_mask
+        self.plant_type_probabilities = plant_type_probabilities
+        self.width, self.height = self.flower_area_mask.shape
+        self.woods_cells = None
+        self.coords = None
+        free_cells = np.count_nonzero(~self.woods_mask)
+        self.no_mow_pc = np.count_nonzero(self.flower_area_mask & ~self.woods_mask)/free_cells if free_cells > 0 else 0
+        park_x, park_y = np.nonzero(self.park_mask)
+        if len(park_x) > 0:
+            self.parkBoundaries = ((int(park_x.min()), int(park_y.min())), (int(park_x.max()), int(park_y.max())))
+        else:
+            self.parkBoundaries = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        if all(source is None or isinstance(source, (str, os.PathLike)) for source in self.sources):
+            # the rasters are loaded again from the files
+            for key in ("flower_area_mask", "park_mask", "woods_mask", "mowable_mask", "plant_type_probabilities", "woods_cells", "no_mow_pc", "parkBoundaries"):
+                del state[key]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if "flower_area_mask" not in state:
+            self.loadRasters()
+
+    def isPointInFlowerArea(self, point):
+        return self.isInside(point) and bool(self.flower_area_mask[point[0], point[1]])
+
+    def isPointInParkBoundaries(self, point):
+        return self.isInside(point) and bool(self.park_mask[point[0], point[1]])
+
+    def isPointInWoodsArea(self, point: Tuple[int, int]):
+        return self.isInside(point) and bool(self.woods_mask[point[0], point[1]])
+
+    def getRandomPositionInWoods(self, random):
+        if self.woods_cells is None:
+            self.woods_cells = np.flatnonzero(self.woods_mask)
+        if len(self.woods_cells) == 0:
+            raise ValueError("The woods mask has no cells to place a colony")
+        # a single uniform draw, valid for both random.Random and numpy RandomState
+        index = int(random.random()*len(self.woods_cells))
+        x, y = divmod(int(self.woods_cells[index]), self.height)
+        return (x, y)
@@ -4,9 +4,12 @@ from .CustomDataCollector import CustomDataCollector
 from .Model import GreenArea
 from .CustomModularServer import CustomModularServer
 from .CustomMultiGrid import CustomMultiGrid
+from .Aggregates import AggregateRegistry
+from .SweepRunner import runSweep, getParameterGrid, sampleParameters
+from .DefaultParams import getModelParams
 from .CustomTime import RandomActivationByTypeOrdered
 from .Server import server
-from .Utils import ColonySize, PlantStage, BeeType, BeeStage, PlantType, FlowerAreaType, Season, AreaConstructor
+from .Utils import ColonySize, PlantStage, BeeType, BeeStage, PlantType, FlowerAreaType, Season, AreaConstructor, RasterAreaConstructor
 
 __all__ = [
     "CustomAgents",
@@ -14,6 +17,11 @@ __all__ = [
     "GreenArea",
     "CustomModularServer",
     "CustomMultiGrid",
+    "AggregateRegistry",
+    "runSweep",
+    "getParameterGrid",
+    "sampleParameters",
+    "getModelParams",
     "RandomActivationByTypeOrdered",
     "server",
     "ColonySize",
@@ -24,6 +32,7 @@ __all__ = [
     "FlowerAreaType",
     "Season",
     "AreaConstructor",
+    "RasterAreaConstructor",
 ]
 
 __title__ = "bumblebee-pollination-abm"
@@ -1,4 +1,7 @@
 import logging
+import logging.handlers
+import queue
+import atexit
 import time
 import os
 
@@ -13,4 +16,60 @@ logging.basicConfig(filename=filename,
             datefmt='%H:%M:%S',
             level=logging.DEBUG)
 
-logger = logging.getLogger('bumblebee_pollination_abm')
\ No newline at end of file
+logger = logging.getLogger('bumblebee_pollination_abm')
+# background logging: the records of the package logger wait in a bounded queue,
+# drained to the handlers they would reach by a listener thread
+listener = None
+listener_pid = None
+queue_handler = None
+
+
+class BlockingQueueHandler(logging.handlers.QueueHandler):
+    # wait for room in the queue instead of failing when it is full
+    def enqueue(self, record):
+        self.queue.put(record)
+
+
+class BlockingQueueListener(logging.handlers.QueueListener):
+    def enqueue_sentinel(self):
+        self.queue.put(self._sentinel)
+
+
+def startBackgroundLogging(maxsize = 10000):
+    """
+    Send the records of the package logger through a queue of maxsize records, written by a background thread
+    to the handlers of the package and root loggers, which are left untouched.
+    The listener is per process: a forked process starts its own one at its first call.
+    """
+    global listener, listener_pid, queue_handler
+    if listener is not None and listener_pid == os.getpid():
+        return
+    if queue_handler is not None:
+        # inherited from the parent process, its queue has no listener here
+        logger.removeHandler(queue_handler)
+    handlers = logger.handlers + logging.getLogger().handlers
+    log_queue = queue.Queue(maxsize)
+    queue_handler = BlockingQueueHandler(log_queue)
+    listener = BlockingQueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    listener_pid = os.getpid()
+    logger.addHandler(queue_handler)
+    logger.propagate = False
+    atexit.register(stopBackgroundLogging)
+
+
+def stopBackgroundLogging():
+    """
+    Write the queued records and log again from the calling thread.
+    """
+    global listener, queue_handler
+    if listener is None or listener_pid != os.getpid():
+        return
+    logger.removeHandler(queue_handler)
+    logger.propagate = True
+    listener.stop()
+    for handler in listener.handlers:
+        handler.flush()
+    listener = None
+    queue_handler = None
+    atexit.unregister(stopBackgroundLogging)
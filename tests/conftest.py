@@ -0,0 +1,43 @@
+import pytest
+from bumblebee_pollination_abm.Model import GreenArea
+from bumblebee_pollination_abm.DefaultParams import getModelParams
+
+
+def runModel(model, steps):
+    for _ in range(steps):
+        model.step()
+    return model
+
+
+def buildModel(steps = 0, **params):
+    # the default parameters, over which params are set
+    return runModel(GreenArea(**{**getModelParams(), **params}), steps)
+
+
+def stepModels(models, steps, every):
+    # steps the models together, yielding the steps done every `every` steps
+    for step in range(1, steps+1):
+        for model in models:
+            model.step()
+        if step % every == 0:
+            yield step
+
+
+@pytest.fixture
+def model_params():
+    return getModelParams()
+
+
+@pytest.fixture(scope="session")
+def make_model():
+    return buildModel
+
+
+@pytest.fixture(scope="session")
+def run_model():
+    return runModel
+
+
+@pytest.fixture(scope="session")
+def run_models():
+    return stepModels
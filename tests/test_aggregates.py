@@ -0,0 +1,31 @@
+import pytest
+from bumblebee_pollination_abm.Model import (
+    checkAggregate,
+    computeIntraInterPollen, scanIntraInterPollen,
+    computeSeedProducingProbability, scanSeedProducingProbability,
+    computPlantNectarAverage, scanPlantNectarAverage,
+    computPlantPollenAverage, scanPlantPollenAverage
+)
+
+REPORTERS = [
+    (computeIntraInterPollen, scanIntraInterPollen),
+    (computeSeedProducingProbability, scanSeedProducingProbability),
+    (computPlantNectarAverage, scanPlantNectarAverage),
+    (computPlantPollenAverage, scanPlantPollenAverage)
+]
+
+
+@pytest.mark.parametrize("mode", [{}, {"seed_bank": True, "cohort_brood": True}, {"aggregated_nest_bees": True}])
+def test_aggregates_match_scans(make_model, run_models, mode):
+    model = make_model(data_collection=True, **mode)
+    assert model.aggregates is not None
+    for step in run_models([model], 3000, 50):
+        for compute, scan in REPORTERS:
+            assert compute(model) == pytest.approx(scan(model), rel=1e-6, abs=1e-6), (step, compute.__name__)
+
+
+def test_debug_check_raises_on_mismatch(make_model):
+    model = make_model(data_collection=True, aggregates_debug=True)
+    assert checkAggregate(model, "reporter", 1.0, lambda model: 1.0) == 1.0
+    with pytest.raises(AssertionError):
+        checkAggregate(model, "reporter", 1.0, lambda model: 2.0)
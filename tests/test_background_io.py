@@ -0,0 +1,48 @@
+import logging
+from bumblebee_pollination_abm.setup_logger import logger, startBackgroundLogging, stopBackgroundLogging
+
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+def test_background_logging_keeps_root_handlers():
+    # the root handlers are swapped for a list handler, so the records never reach the log file
+    root = logging.getLogger()
+    root_handlers = root.handlers
+    handler = ListHandler()
+    root.handlers = [handler]
+    try:
+        startBackgroundLogging(maxsize=5)
+        assert root.handlers == [handler]
+        for i in range(100):
+            logger.info(f"record {i}")
+        stopBackgroundLogging()
+    finally:
+        root.handlers = root_handlers
+    assert handler.messages == [f"record {i}" for i in range(100)]
+    assert logger.propagate and not logger.handlers
+
+
+def test_background_writer_only_with_storage(make_model, tmp_path):
+    assert make_model(background_io=True).background_writer is None
+    assert make_model(data_collection=True, background_io=True).background_writer is None
+    model = make_model(data_collection=True, data_collection_dir=str(tmp_path), background_io=True)
+    assert model.background_writer is not None
+
+
+def test_background_writer_matches_synchronous_storage(make_model, tmp_path):
+    models = []
+    for background_io in (False, True):
+        model = make_model(300, data_collection=True, background_io=background_io, data_collection_dir=str(tmp_path / str(background_io)))
+        model.flushOutput()
+        models.append(model)
+    for name in ("datacollector_colonies", "datacollector_bumblebees", "datacollector_plants"):
+        synchronous, background = (getattr(model, name) for model in models)
+        assert synchronous.get_model_vars_dataframe().equals(background.get_model_vars_dataframe())
+        assert synchronous.get_agent_vars_dataframe().equals(background.get_agent_vars_dataframe())
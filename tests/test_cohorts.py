@@ -0,0 +1,76 @@
+import pytest
+from bumblebee_pollination_abm.CustomAgents import BeeAgent, ColonyAgent
+from bumblebee_pollination_abm.Utils import BeeStage
+
+
+def test_emerging_bees_run_their_emergence_day(make_model, run_model, monkeypatch):
+    model = make_model(cohort_brood=True)
+    emerged = {}
+    stepped = set()
+    create_bumblebee = model.createBumblebee
+    daily_activities = BeeAgent.dailyActivities
+
+    def createBumblebee(bee_type, bee_stage, colony):
+        bee = create_bumblebee(bee_type, bee_stage, colony)
+        if bee_stage == BeeStage.BEE:
+            emerged[bee.unique_id] = model.schedule.day_count
+        return bee
+
+    def dailyActivities(bee):
+        stepped.add((bee.unique_id, model.schedule.day_count))
+        daily_activities(bee)
+
+    monkeypatch.setattr(model, "createBumblebee", createBumblebee)
+    monkeypatch.setattr(BeeAgent, "dailyActivities", dailyActivities)
+    run_model(model, 2400)
+    assert emerged
+    assert all((bee_id, day) in stepped for bee_id, day in emerged.items())
+
+
+def getColonyAccounting(make_model, run_model, monkeypatch, days, **mode):
+    # population size, size class and consumption of each colony at each daily pass,
+    # with the brood and nest bees kept in the colony counters
+    model = make_model(**mode)
+    accounting = []
+    counters = []
+    use_resources = ColonyAgent.useResources
+
+    def useResources(colony):
+        nectar, pollen = colony.getResources()
+        use_resources(colony)
+        accounting.append((
+            model.schedule.day_count, 
+            colony.unique_id, 
+            colony.getPopulationSize(), 
+            colony.getSize(), 
+            nectar - colony.nectar, 
+            pollen - colony.pollen
+        ))
+        counters.append((colony.brood_size, colony.nest_bees_size))
+
+    with monkeypatch.context() as patch:
+        patch.setattr(ColonyAgent, "useResources", useResources)
+        run_model(model, 40*days)
+    return sorted(accounting), counters
+
+
+def assertSameAccounting(agents, aggregated):
+    assert [entry[:4] for entry in agents] == [entry[:4] for entry in aggregated]
+    for agent_entry, aggregated_entry in zip(agents, aggregated):
+        assert agent_entry[4:] == pytest.approx(aggregated_entry[4:]), agent_entry[:2]
+
+
+def test_cohort_brood_matches_agent_brood_accounting(make_model, run_model, monkeypatch):
+    # the first 40 days, before the foraging of the two runs diverges
+    agents, agent_counters = getColonyAccounting(make_model, run_model, monkeypatch, 40)
+    cohorts, cohort_counters = getColonyAccounting(make_model, run_model, monkeypatch, 40, cohort_brood=True)
+    assert not any(brood for brood, _ in agent_counters) and any(brood for brood, _ in cohort_counters)
+    assertSameAccounting(agents, cohorts)
+
+
+def test_aggregated_nest_bees_match_agent_nest_bees_accounting(make_model, run_model, monkeypatch):
+    # the first 50 days, past the emergence of the first nest bees
+    agents, agent_counters = getColonyAccounting(make_model, run_model, monkeypatch, 50)
+    aggregated, aggregated_counters = getColonyAccounting(make_model, run_model, monkeypatch, 50, aggregated_nest_bees=True)
+    assert not any(nest_bees for _, nest_bees in agent_counters) and any(nest_bees for _, nest_bees in aggregated_counters)
+    assertSameAccounting(agents, aggregated)
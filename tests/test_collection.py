@@ -0,0 +1,33 @@
+import numpy as np
+import pandas as pd
+
+
+def test_cadence_windows_line_up_with_days(make_model):
+    full = make_model(400, data_collection=True)
+    downsampled = make_model(400, data_collection=True, data_collection_cadence=40, data_collection_reduction="mean")
+    series = full.datacollector_plants.get_model_vars_dataframe()
+    records = downsampled.datacollector_plants.get_model_vars_dataframe()
+    assert list(records.index) == list(range(0, 401, 40))
+    assert np.allclose(records.iloc[0], series.iloc[0])
+    for i, step in enumerate(records.index[1:], 1):
+        assert np.allclose(records.iloc[i], series.iloc[step-39:step+1].mean()), step
+
+
+def test_colony_cadence_in_days(make_model):
+    full = make_model(400, data_collection=True)
+    downsampled = make_model(400, data_collection=True, colony_collection_cadence=2)
+    steps_per_day = full.steps_per_day
+    full_steps = set(full.datacollector_colonies.get_agent_vars_dataframe().index.get_level_values("Step"))
+    steps = set(downsampled.datacollector_colonies.get_agent_vars_dataframe().index.get_level_values("Step"))
+    assert steps == {step for step in full_steps if (step // steps_per_day) % 2 == 0}
+
+
+def test_storage_matches_memory(make_model, tmp_path):
+    # the columnar backend gives the same dataframes as the in-memory mesa one
+    memory = make_model(600, data_collection=True)
+    storage = make_model(600, data_collection=True, data_collection_dir=str(tmp_path))
+    storage.flushOutput()
+    for name in ("datacollector_colonies", "datacollector_bumblebees", "datacollector_plants"):
+        expected, collector = getattr(memory, name), getattr(storage, name)
+        pd.testing.assert_frame_equal(collector.get_model_vars_dataframe(), expected.get_model_vars_dataframe())
+        pd.testing.assert_frame_equal(collector.get_agent_vars_dataframe(), expected.get_agent_vars_dataframe())
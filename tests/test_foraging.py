@@ -0,0 +1,23 @@
+import pytest
+from bumblebee_pollination_abm.CustomAgents import BeeAgent, PlantAgent
+
+
+def getState(model):
+    bees = model.schedule.agents_by_type[BeeAgent]
+    plants = model.schedule.agents_by_type[PlantAgent]
+    return (
+        sorted((key, bee.pos, bee.bee_stage, bee.nectar, bee.pollen_total) for key, bee in bees.items()),
+        sorted((key, plant.plant_stage, plant.seed_production_prob, plant.nectar_storage) for key, plant in plants.items())
+    )
+
+
+def test_single_macro_step_matches_default(make_model, run_models):
+    default = make_model()
+    macro = make_model(foraging_macro_steps=1)
+    for step in run_models([default, macro], 2600, 100):
+        assert getState(default) == getState(macro), step
+
+
+def test_macro_steps_must_divide_steps_per_day(make_model):
+    with pytest.raises(ValueError):
+        make_model(steps_per_day=20, foraging_macro_steps=3)
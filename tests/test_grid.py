@@ -0,0 +1,163 @@
+import numpy as np
+import pytest
+from bumblebee_pollination_abm.CustomMultiGrid import CustomMultiGrid
+from bumblebee_pollination_abm.CustomAgents import PlantAgent
+from bumblebee_pollination_abm.Utils import PlantStage, PlantType, Season
+
+
+@pytest.fixture(scope="module")
+def model(make_model):
+    # past the first flower deaths and seed germinations
+    return make_model(2000)
+
+
+def getFlowers(model):
+    return [plant for plant in model.schedule.agents_by_type[PlantAgent].values() if plant.plant_stage == PlantStage.FLOWER]
+
+
+def test_flower_type_counts_match_scan(model):
+    flowers = getFlowers(model)
+    random = np.random.RandomState(2)
+    for _ in range(200):
+        pos = (int(random.randint(model.width)), int(random.randint(model.height)))
+        radius = int(random.randint(1, 12))
+        include_center = bool(random.randint(2))
+        expected = np.zeros(len(PlantType), dtype=int)
+        for plant in flowers:
+            distance = max(abs(plant.pos[0]-pos[0]), abs(plant.pos[1]-pos[1]))
+            if distance <= radius and (include_center or distance > 0):
+                expected[plant.plant_type.value-1] += 1
+        assert np.array_equal(model.grid.get_flower_type_counts(pos, include_center, radius), expected)
+
+
+def test_flower_index_matches_scan(model):
+    grid = model.grid
+    expected = {}
+    for plant in getFlowers(model):
+        expected.setdefault(plant.pos, set()).add(plant.unique_id)
+    for x in range(model.width):
+        for y in range(model.height):
+            flowers = {plant.unique_id for plant in grid.flowers[x][y]}
+            assert flowers == expected.get((x, y), set())
+            assert grid.flower_cells[x, y] == len(flowers)
+            assert grid.flower_counts[:, x, y].sum() == len(flowers)
+
+
+
+def test_type_layers_match_scan(model):
+    grid = model.grid
+    layers = {"plant": grid.plants, "bee": grid.bees, "colony": grid.colonies}
+    for x in range(model.width):
+        for y in range(model.height):
+            # the layers keep the agents of each type in grid order
+            for agent_type, layer in layers.items():
+                assert layer[x][y] == [agent for agent in grid.grid[x][y] if agent.agent_type == agent_type]
+            assert grid.seeds[x][y] == [plant for plant in grid.plants[x][y] if plant.plant_stage == PlantStage.SEED]
+    for agents in model.schedule.agents_by_type.values():
+        for agent in agents.values():
+            if agent.agent_type in layers:
+                assert agent in layers[agent.agent_type][agent.pos[0]][agent.pos[1]]
+
+@pytest.mark.parametrize("torus", [False, True])
+def test_random_neighbor_matches_neighborhood(torus):
+    grid = CustomMultiGrid(20, 15, torus=torus)
+    positions = np.random.RandomState(4)
+    random, expected_random = np.random.RandomState(9), np.random.RandomState(9)
+    for _ in range(500):
+        pos = (int(positions.randint(grid.width)), int(positions.randint(grid.height)))
+        radius = int(positions.randint(1, 11))
+        include_center = bool(positions.randint(2))
+        neighborhood = grid.get_neighborhood(pos, True, include_center, radius)
+        expected = neighborhood[expected_random.randint(0, len(neighborhood))]
+        assert grid.get_random_neighbor(pos, random, include_center, radius) == expected
+
+
+def getSuitableCellsByScan(model, plants, season, pos, include_center, radius, day):
+    # the cell by cell search, before the season index
+    grid = model.grid
+    seed_types = [t.value-1 for t, s in grid.seed_seasons.items() if s == season]
+    cells = []
+    for x, y in grid.get_neighborhood(pos, True, include_center, radius):
+        count = sum(
+            1 for plant in plants.get((x, y), [])
+            if plant.plant_stage in (PlantStage.SEED, PlantStage.FLOWER) and plant.plant_season == season and plant.age == 0
+        )
+        count += sum(1 for t in seed_types if grid.seed_sowing_day[t, x, y] == day)
+        if count == 0 and model.areaConstructor.isPointInParkBoundaries((x, y)):
+            cells.append((x, y))
+    return cells
+
+
+@pytest.mark.parametrize("seed_bank", [False, True])
+def test_seed_cells_match_scan(make_model, run_model, seed_bank):
+    model = make_model(seed_bank=seed_bank)
+    random = np.random.RandomState(6)
+    for checkpoint in range(6):
+        # right after a daily pass, when the new plants and seeds have age 0
+        run_model(model, 40*25+1 if checkpoint == 0 else 40*9)
+        day = model.schedule.day_count
+        plants = {}
+        for plant in model.schedule.agents_by_type[PlantAgent].values():
+            plants.setdefault(plant.pos, []).append(plant)
+        for _ in range(100):
+            pos = (int(random.randint(model.width)), int(random.randint(model.height)))
+            season = list(Season)[random.randint(len(Season))]
+            radius = int(random.randint(1, 6))
+            include_center = bool(random.randint(2))
+            expected = getSuitableCellsByScan(model, plants, season, pos, include_center, radius, day)
+            assert model.grid.get_neighbor_cells_suitable_for_seeds(model.areaConstructor, season, pos, True, include_center, radius, day) == expected
+            qty = int(random.randint(1, 30))
+            expanding = radius
+            while len(getSuitableCellsByScan(model, plants, season, pos, False, expanding, day)) < qty and expanding < 8:
+                expanding += 1
+            assert model.grid.get_neighbor_cells_suitable_for_seeds_expanding(model.areaConstructor, season, pos, qty, radius, 8, day) == \
+                getSuitableCellsByScan(model, plants, season, pos, False, expanding, day)
+
+
+def test_seed_bank_germinates_before_dispersal(make_model, run_model):
+    # the flowers dispersing seeds see the flowers germinated on the same day as occupants
+    model = make_model(seed_bank=True)
+    grid = model.grid
+    create_new_flowers = model.createNewFlowers
+    dispersal_days = set()
+    def createNewFlowers(*args, **kwargs):
+        dispersal_days.add(model.schedule.day_count)
+        assert not ((grid.seed_counts > 0) & (grid.seed_germination_day <= model.schedule.day_count)).any()
+        return create_new_flowers(*args, **kwargs)
+    model.createNewFlowers = createNewFlowers
+    germination_days = set(grid.seed_germination_day[grid.seed_counts > 0].tolist())
+    run_model(model, 40*72)
+    assert dispersal_days & germination_days
+
+
+def test_cached_queries_follow_flower_changes(make_model, run_model):
+    model = make_model(40*30)
+    grid = model.grid
+    random = np.random.RandomState(8)
+    queries = [
+        ((int(random.randint(model.width)), int(random.randint(model.height))), bool(random.randint(2)), int(random.randint(1, 6)))
+        for _ in range(100)
+    ]
+    # the flowers change on days 36, 61, 71 and 111
+    for days in [10, 25, 10, 40]:
+        # the queries cached before the flowers change must not be answered again
+        for pos, include_center, radius in queries:
+            grid.get_flower_type_counts(pos, include_center, radius)
+            grid.get_plant_neighbors(pos, True, include_center, radius)
+        version = grid.flower_index_version
+        run_model(model, 40*days)
+        assert grid.flower_index_version != version
+        flowers = getFlowers(model)
+        for pos, include_center, radius in queries:
+            expected = set()
+            for plant in flowers:
+                distance = max(abs(plant.pos[0]-pos[0]), abs(plant.pos[1]-pos[1]))
+                if distance <= radius and (include_center or distance > 0):
+                    expected.add(plant.unique_id)
+            neighbors = grid.get_plant_neighbors(pos, True, include_center, radius)
+            assert {plant.unique_id for plant in neighbors} == expected
+            assert neighbors == grid.compute_plant_neighbors(pos, True, include_center, radius)
+            assert np.array_equal(grid.get_flower_type_counts(pos, include_center, radius), grid.compute_flower_type_counts(pos, include_center, radius))
+            for plant_type in PlantType:
+                typed = grid.get_plant_neighbors(pos, True, include_center, radius, plant_type)
+                assert typed == [plant for plant in neighbors if plant.plant_type == plant_type]
@@ -0,0 +1,68 @@
+import pytest
+from bumblebee_pollination_abm.CustomAgents import BeeAgent
+from bumblebee_pollination_abm.Utils import BeeType, BeeStage
+
+
+@pytest.fixture(scope="module")
+def shared_model(make_model):
+    return make_model()
+
+
+# mid-day steps and steps right after a daily pass, over a year and into the next one,
+# with unmated queens at 40*150+17 and hibernating queens at 40*189+9
+@pytest.fixture(scope="module", params=[40*10+1, 40*40+17, 40*80, 40*120+23, 40*150+17, 40*189+9, 40*200+1])
+def model(request, shared_model, run_model):
+    # the checkpoints advance the same model
+    return run_model(shared_model, request.param - shared_model.schedule.steps)
+
+
+def test_active_sets_match_scan(model):
+    schedule = model.schedule
+    for agent_class, agents in schedule.agents_by_type.items():
+        active_agents = schedule.active_agents_by_type[agent_class]
+        assert set(active_agents) == {key for key, agent in agents.items() if agent.isActive()}
+        assert all(agents[key] is agent for key, agent in active_agents.items())
+
+
+def test_event_calendar_matches_scan(model):
+    schedule = model.schedule
+    for agent_class, agents in schedule.agents_by_type.items():
+        daily_agents = schedule.daily_agents_by_type[agent_class]
+        event_days = schedule.event_days[agent_class]
+        assert set(daily_agents) == {key for key, agent in agents.items() if agent.getNextEventDay() is None}
+        assert all(agents[key] is agent for key, agent in daily_agents.items())
+        assert set(event_days) == set(agents) - set(daily_agents)
+        for key, day in event_days.items():
+            # the events already due are moved to the next daily pass
+            assert day == max(agents[key].getNextEventDay(), schedule.day_count+1)
+        assert {(day, key) for key, day in event_days.items()} <= {(day, key) for day, _, key in schedule.event_calendar[agent_class]}
+
+
+def test_due_agents_match_scan(model, run_model, monkeypatch):
+    # the agents popped from the calendar in the next daily pass are the ones whose event is due
+    schedule = model.schedule
+    expected = {
+        agent_class: {key for key, agent in agents.items() if agent.getNextEventDay() is not None and agent.getNextEventDay() <= schedule.day_count+1}
+        for agent_class, agents in schedule.agents_by_type.items()
+    }
+    popped = {}
+    pop_due_agents = schedule.pop_due_agents
+    def popDueAgents(type_class):
+        agent_keys = pop_due_agents(type_class)
+        popped[type_class] = set(agent_keys)
+        return agent_keys
+    monkeypatch.setattr(schedule, "pop_due_agents", popDueAgents)
+    run_model(model, -schedule.steps % model.steps_per_day + 1)
+    assert popped == expected
+
+
+def test_bee_index_matches_scan(model):
+    bees = model.schedule.agents_by_type[BeeAgent]
+    expected = {}
+    for key, bee in bees.items():
+        expected.setdefault((bee.bee_type, bee.bee_stage), set()).add(key)
+    assert {index_key: set(index) for index_key, index in model.bees_by_type_stage.items() if index} == expected
+    assert all(bees[key] is bee for index in model.bees_by_type_stage.values() for key, bee in index.items())
+    assert set(model.unmated_queens) == {
+        key for key, bee in bees.items() if bee.bee_type == BeeType.QUEEN and bee.bee_stage == BeeStage.BEE and not bee.mated
+    }
@@ -0,0 +1,90 @@
+import random
+import pickle
+import numpy as np
+import pytest
+from bumblebee_pollination_abm.Utils import AreaConstructor, RasterAreaConstructor, FlowerAreaType, PlantType, Season, SEASON_PLANT_TYPES
+from bumblebee_pollination_abm.CustomAgents import PlantAgent
+
+
+def getMasks():
+    flower_area = np.zeros((10, 8), dtype=bool)
+    flower_area[4:6, 4:6] = True
+    park = np.zeros((10, 8), dtype=bool)
+    park[2:8, 1:7] = True
+    woods = np.zeros((10, 8), dtype=bool)
+    woods[0, :3] = True
+    return flower_area, park, woods
+
+
+@pytest.mark.parametrize("rng", [random.Random(1), np.random.RandomState(1)])
+def test_random_position_in_woods_stays_in_mask(rng):
+    flower_area, park, woods = getMasks()
+    landscape = RasterAreaConstructor(flower_area, park, woods)
+    positions = {landscape.getRandomPositionInWoods(rng) for _ in range(200)}
+    assert positions == {(0, 0), (0, 1), (0, 2)}
+
+
+def test_random_position_in_empty_woods():
+    flower_area, park, woods = getMasks()
+    landscape = RasterAreaConstructor(flower_area, park, np.zeros_like(woods))
+    with pytest.raises(ValueError):
+        landscape.getRandomPositionInWoods(random.Random(1))
+
+
+def test_raster_base_attributes(tmp_path):
+    paths = []
+    for name, mask in zip(("flower_area", "park", "woods"), getMasks()):
+        paths.append(tmp_path / f"{name}.npy")
+        np.save(paths[-1], mask)
+    landscape = pickle.loads(pickle.dumps(RasterAreaConstructor(*paths)))
+    assert landscape.area_type is None
+    assert landscape.parkBoundaries == ((2, 1), (7, 6))
+    assert landscape.no_mow_pc == pytest.approx(4/77)
+    assert (landscape.width, landscape.height) == (10, 8)
+
+
+def test_raster_has_the_attributes_of_the_built_in_landscapes():
+    built_in = AreaConstructor(FlowerAreaType.SOUTH_SECTION.value, 50, 50, 0.2)
+    landscape = RasterAreaConstructor(*getMasks())
+    # the shape functions describe the built-in landscapes only
+    shape_functions = {"getCoordinateFunction", "isPointInFlowerAreaShape"}
+    assert set(vars(built_in)) - shape_functions <= set(vars(landscape))
+
+
+def test_model_from_raster_files(make_model, tmp_path):
+    width, height = 30, 20
+    x = np.arange(width)[:, None]
+    y = np.arange(height)[None, :]
+    woods = (x < 3) | (x >= width-3) | (y < 3) | (y >= height-3)
+    park = ~woods
+    flower_area = park & (y >= 8) & (y < 14)
+    # spring: SPRING_TYPE1 on the left half, SPRING_TYPE3 on the right one
+    # summer: SUMMER_TYPE1 or SUMMER_TYPE2 with the same probability, autumn: always AUTUMN_TYPE2
+    probabilities = np.zeros((len(PlantType), width, height))
+    probabilities[PlantType.SPRING_TYPE1.value-1] = x < width//2
+    probabilities[PlantType.SPRING_TYPE3.value-1] = x >= width//2
+    probabilities[PlantType.SUMMER_TYPE1.value-1] = 0.5
+    probabilities[PlantType.SUMMER_TYPE2.value-1] = 0.5
+    probabilities[PlantType.AUTUMN_TYPE2.value-1] = 1
+    paths = []
+    for name, raster in zip(("flower_area", "park", "woods", "probabilities"), (flower_area, park, woods, probabilities)):
+        paths.append(tmp_path / f"{name}.npy")
+        np.save(paths[-1], raster)
+    landscape = RasterAreaConstructor(*paths)
+    assert isinstance(landscape.plant_type_probabilities, np.memmap)
+    # the pickled landscape only keeps the paths of the rasters
+    assert len(pickle.dumps(landscape)) < probabilities.nbytes
+
+    model = make_model(40, landscape=landscape)
+    assert (model.width, model.height) == (width, height)
+    plant_types = {season: {} for season in Season}
+    for plant in model.schedule.agents_by_type[PlantAgent].values():
+        assert flower_area[plant.pos]
+        assert plant.plant_type in SEASON_PLANT_TYPES[plant.plant_season]
+        plant_types[plant.plant_season].setdefault(plant.pos, set()).add(plant.plant_type)
+    assert set(plant_types[Season.SPRING]) == {tuple(pos) for pos in np.argwhere(flower_area).tolist()}
+    for pos, types in plant_types[Season.SPRING].items():
+        assert types == {PlantType.SPRING_TYPE1 if pos[0] < width//2 else PlantType.SPRING_TYPE3}
+    summer_types = set.union(*plant_types[Season.SUMMER].values())
+    assert summer_types == {PlantType.SUMMER_TYPE1, PlantType.SUMMER_TYPE2}
+    assert set.union(*plant_types[Season.AUTUMN].values()) == {PlantType.AUTUMN_TYPE2}
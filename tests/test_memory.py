@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+from bumblebee_pollination_abm.Utils import PlantType, RewardedMemory
+
+
+def getListMeanRewards(rewards):
+    # the list memory of BeeAgent before the ring buffer
+    by_type = {}
+    for plant_type, reward in rewards:
+        by_type.setdefault(plant_type, []).append(reward)
+    return {plant_type: np.mean(values) for plant_type, values in by_type.items()}
+
+
+@pytest.mark.parametrize("max_memory", [1, 3, 10])
+def test_ring_buffer_matches_list(max_memory):
+    random = np.random.RandomState(max_memory)
+    memory = RewardedMemory(max_memory)
+    rewards = []
+    plant_types = list(PlantType)
+    for i in range(2000):
+        action = random.random()
+        if action < 0.01:
+            memory.clear()
+            rewards = []
+        elif action < 0.02:
+            max_memory = int(random.randint(0, 12))
+            memory.resize(max_memory)
+            rewards = rewards[-max_memory:] if max_memory > 0 else []
+        elif max_memory > 0:
+            plant_type = plant_types[random.randint(0, 4)]
+            reward = float(random.uniform(0, 1))
+            memory.push(plant_type, reward)
+            rewards.append((plant_type, reward))
+            if len(rewards) > max_memory:
+                rewards.pop(0)
+        assert list(memory) == rewards
+        assert len(memory) == len(rewards)
+        expected = getListMeanRewards(rewards)
+        means = memory.getMeanRewards()
+        assert set(means) == set(expected)
+        for plant_type in plant_types:
+            assert memory.getCount(plant_type) == sum(1 for t, _ in rewards if t == plant_type)
+            assert memory.getMeanReward(plant_type) == pytest.approx(expected.get(plant_type, 0))
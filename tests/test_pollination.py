@@ -0,0 +1,24 @@
+import pytest
+from bumblebee_pollination_abm.CustomAgents import PlantAgent
+from bumblebee_pollination_abm.Utils import PlantStage
+
+
+def test_deposition_matches_plant_pass(make_model, run_models):
+    model = make_model()
+    pollinated = 0
+    for _ in run_models([model], 2400, 200):
+        # the plant step before the deposition driven by the bees: every flower receives the pollen
+        # of the bees in its cell, in grid order
+        expected = {}
+        for plant in model.schedule.agents_by_type[PlantAgent].values():
+            probability = plant.seed_production_prob
+            if plant.plant_stage == PlantStage.FLOWER:
+                for bee in model.grid.get_cell_bumblebee_list_contents(plant.pos):
+                    same_pollen = bee.pollen_load[plant.plant_type.value-1]
+                    probability = min(probability + (2*same_pollen - bee.pollen_total)/bee.max_pollen_load, 1)
+            expected[plant.unique_id] = probability
+            pollinated += probability != plant.seed_production_prob
+        model.depositPollen()
+        for key, plant in model.schedule.agents_by_type[PlantAgent].items():
+            assert plant.seed_production_prob == pytest.approx(expected[key], abs=1e-12)
+    assert pollinated > 0
@@ -0,0 +1,47 @@
+import copy
+import pytest
+from bumblebee_pollination_abm.SweepRunner import runSweep, runChunk, getParameterGrid, getRunRecords, sampleParameters
+
+
+def test_parameter_grid():
+    design = getParameterGrid({"no_mow_pc": [0.2, 0.5], "queens_quantity": [2, 3]})
+    assert design == [
+        {"no_mow_pc": 0.2, "queens_quantity": 2},
+        {"no_mow_pc": 0.2, "queens_quantity": 3},
+        {"no_mow_pc": 0.5, "queens_quantity": 2},
+        {"no_mow_pc": 0.5, "queens_quantity": 3}
+    ]
+
+
+def test_sampled_parameters_within_ranges():
+    design = sampleParameters({"no_mow_pc": (0.1, 0.9), "queens_quantity": (1, 4), "seed_bank": [False, True]}, 20, seed=3)
+    assert len(design) == 20
+    assert all(0.1 <= record["no_mow_pc"] < 0.9 and 1 <= record["queens_quantity"] <= 4 for record in design)
+    assert design == sampleParameters({"no_mow_pc": (0.1, 0.9), "queens_quantity": (1, 4), "seed_bank": [False, True]}, 20, seed=3)
+
+
+def test_runs_do_not_share_parameters(model_params):
+    base_params = copy.deepcopy(model_params)
+    runChunk(model_params, getRunRecords([{}], [1, 2], 50))
+    assert model_params == base_params
+
+
+@pytest.mark.parametrize("chunk_size", [1, 4])
+def test_sweep_results_independent_of_chunk_size(model_params, chunk_size):
+    design = [{"queens_quantity": 2}, {"queens_quantity": 3}]
+    records = getRunRecords(design, [1, 2], 300)
+    expected = {record[0]: runChunk(model_params, [record])[0] for record in records}
+    results = {result["run_id"]: result for result in runSweep(model_params, design, [1, 2], 300, max_workers=2, chunk_size=chunk_size)}
+    assert all("error" not in result for result in results.values())
+    assert results == expected
+
+
+def test_runs_store_their_data_apart(model_params, tmp_path):
+    base_params = {**model_params, "data_collection": True, "data_collection_dir": str(tmp_path)}
+    results = runChunk(base_params, getRunRecords([{}], [1, 2], 100))
+    assert all("error" not in result for result in results)
+    run_dirs = sorted(path.name for path in tmp_path.iterdir())
+    assert run_dirs == ["run_00000", "run_00001"]
+    files = [{path.relative_to(tmp_path / run_dir) for path in (tmp_path / run_dir).rglob("*.npy")} for run_dir in run_dirs]
+    assert files[0] and files[0] == files[1]
+    assert not any(path.is_file() for path in tmp_path.iterdir())